@@ -1,17 +1,87 @@
-from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_functions_agent
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains import LLMChain
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
 from langchain_community.callbacks.manager import get_openai_callback
+from cachetools import LRUCache
 from loguru import logger
-import json
+import asyncio
+import functools
+import orjson
 import re
+import threading
 
 from .tools import create_lahaus_tools
 from .templates import format_welcome_message, format_filter_summary
 from .memory import PropertyConciergeMemory
-from .config import OPENAI_API_KEY, MODEL_NAME, TEMPERATURE
+from .cache import SemanticResponseCache
+from .search import get_catalog_version
+from .config import (
+    OPENAI_API_KEY,
+    MODEL_NAME,
+    SUMMARY_MODEL_NAME,
+    TEMPERATURE,
+    SEMANTIC_CACHE_ENABLED,
+    EMBEDDING_MODEL_NAME,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_MAX_HISTORY,
+    EXACT_CACHE_SIZE,
+    AGENT_VERBOSE,
+    AGENT_RETURN_INTERMEDIATE_STEPS,
+    STREAM_RESPONSES,
+    STREAM_CHUNK_SIZE
+)
+
+# Shared semantic cache of agent responses, created on first use
+_response_cache = None
+
+def get_response_cache():
+    """Get the shared semantic response cache, creating it if needed.
+    
+    Returns:
+        The SemanticResponseCache instance, or None if caching is disabled
+    """
+    global _response_cache
+    if SEMANTIC_CACHE_ENABLED and _response_cache is None:
+        # Imported here so the OpenAI client (and tiktoken) load on first use
+        from langchain_openai import OpenAIEmbeddings
+        
+        embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL_NAME)
+        _response_cache = SemanticResponseCache(
+            embed_fn=embeddings.embed_query,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_SIZE
+        )
+    return _response_cache
+
+# Replies to short opening messages ("info", "precios"), keyed on the
+# normalized message. A first message has no context, so an exact match
+# can safely reuse the reply, and it is checked before the semantic cache.
+_EXACT_CACHE_MAX_LENGTH = 30
+_exact_cache = LRUCache(maxsize=EXACT_CACHE_SIZE)
+
+# Version of the property catalog the cached replies were made with
+_cached_catalog_version = None
+
+# Guards _exact_cache and _cached_catalog_version, which worker threads
+# of concurrent runs use at the same time
+_exact_cache_lock = threading.Lock()
+
+def _clear_stale_reply_caches():
+    """Drop the cached replies if the property catalog has changed since.
+    
+    Cached replies can quote listings and prices, which must not outlive
+    the catalog they came from.
+    """
+    global _cached_catalog_version
+    version = get_catalog_version()
+    with _exact_cache_lock:
+        if version != _cached_catalog_version:
+            _cached_catalog_version = version
+            _exact_cache.clear()
+            if _response_cache is not None:
+                _response_cache.clear()
 
 def create_agent_prompt():
     """Creates the detailed system prompt for the LaHaus real estate agent.
@@ -77,11 +147,70 @@ def create_agent_prompt():
     
     return system_prompt
 
+# The system prompt, prompt template and tools are the same for every
+# agent, so they are built once at import instead of per session
+_SYSTEM_PROMPT = create_agent_prompt()
+
+# The system prompt must stay byte-identical across requests for OpenAI's
+# prompt prefix caching to apply, so per-user context (summary, known
+# preferences) goes in its own placeholder after the conversation
+_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", _SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="chat_history"),
+        MessagesPlaceholder(variable_name="dynamic_context", optional=True),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ]
+)
+
+_TOOLS = create_lahaus_tools()
+
+@functools.lru_cache(maxsize=None)
+def get_chat_model(model_name, temperature, streaming=False):
+    """Get a shared OpenAI chat model, creating it on first use.
+    
+    Chat models hold no conversation state, so one instance per
+    model/temperature is shared by all agents.
+    
+    Args:
+        model_name: Name of the OpenAI model
+        temperature: Sampling temperature
+        streaming: Whether to stream completions token by token
+        
+    Returns:
+        A ChatOpenAI instance
+    """
+    # Imported here so the OpenAI client (and tiktoken) load on first use
+    from langchain_openai import ChatOpenAI
+    
+    return ChatOpenAI(
+        api_key=OPENAI_API_KEY,
+        model=model_name,
+        temperature=temperature,
+        streaming=streaming
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_agent_runnable():
+    """Get the shared OpenAI functions agent, creating it on first use.
+    
+    The agent runnable is stateless (memory lives in each AgentExecutor),
+    so it is built once and shared by all sessions.
+    
+    Returns:
+        The LangChain agent runnable
+    """
+    llm = get_chat_model(MODEL_NAME, TEMPERATURE, streaming=STREAM_RESPONSES)
+    return create_openai_functions_agent(llm, _TOOLS, _PROMPT)
+
 def create_agent(conversation_history=None):
     """Create a LangChain agent with conversation memory and tools.
     
     This function sets up an advanced real estate agent powered by GPT-4o
     with specialized tools for property search and conversation management.
+    Only the memory and executor are created per session; the model,
+    prompt and tools are shared.
     
     Args:
         conversation_history: Optional list of previous conversation messages
@@ -89,19 +218,13 @@ def create_agent(conversation_history=None):
     Returns:
         A LangChain AgentExecutor instance
     """
-    # Create all tools needed for the agent
-    tools = create_lahaus_tools()
-    
-    # Create OpenAI chat model with appropriate parameters
-    llm = ChatOpenAI(
-        api_key=OPENAI_API_KEY,
-        model=MODEL_NAME,
-        temperature=TEMPERATURE
-    )
+    # Summaries of older messages don't need the main model, so use a
+    # cheaper one to keep the running summary up to date
+    summary_llm = get_chat_model(SUMMARY_MODEL_NAME, 0)
     
     # Create a specialized property concierge memory
     memory = PropertyConciergeMemory(
-        llm=llm,
+        llm=summary_llm,
         memory_key="chat_history",
         return_messages=True
     )
@@ -109,41 +232,64 @@ def create_agent(conversation_history=None):
     # Load conversation history into memory if available
     if conversation_history:
         for message in conversation_history:
-            if message["role"] == "user":
-                memory.chat_memory.add_user_message(message["content"])
-            elif message["role"] == "assistant":
-                memory.chat_memory.add_ai_message(message["content"])
-    
-    # Create the system prompt template with detailed guidance
-    system_prompt = create_agent_prompt()
-    
-    # Create the chat prompt template with appropriate placeholders
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ]
-    )
+            if message.role == "user":
+                memory.chat_memory.add_user_message(message.content)
+            elif message.role == "assistant":
+                memory.chat_memory.add_ai_message(message.content)
     
-    # Create the agent
-    agent = create_openai_functions_agent(llm, tools, prompt)
-    
-    # Create the agent executor with memory and verbose mode
+    # Create the agent executor with memory (verbose output and kept
+    # intermediate steps are for debugging, so both are off by default)
     agent_executor = AgentExecutor(
-        agent=agent, 
-        tools=tools, 
+        agent=get_agent_runnable(), 
+        tools=_TOOLS, 
         memory=memory, 
-        verbose=True,
+        verbose=AGENT_VERBOSE,
         handle_parsing_errors=True,
         max_iterations=5,
         early_stopping_method="generate",
-        return_intermediate_steps=True
+        return_intermediate_steps=AGENT_RETURN_INTERMEDIATE_STEPS
     )
     
     return agent_executor
 
+# Common Colombian neighborhoods and cities
+_LOCATIONS = (
+    "chapinero", "usaquen", "chico", "cedritos", "salitre", 
+    "poblado", "laureles", "envigado", "sabaneta", "belen",
+    "bogota", "medellin", "cali", "barranquilla", "cartagena"
+)
+
+# Common amenities
+_AMENITIES = (
+    "piscina", "gimnasio", "gym", "parqueadero", "parking", 
+    "terraza", "balcón", "balcon", "jardín", "jardin", 
+    "seguridad", "vigilancia", "ascensor", "bbq", "playground"
+)
+
+# Patterns used to extract preferences, compiled once at import. All the
+# budget/room/type patterns are fused into one alternation so the whole
+# conversation is scanned in a single pass; the outer named group of each
+# match tells which preference it belongs to.
+_WORD_RE = re.compile(r'\w+')
+_PREFERENCE_RE = re.compile(
+    r'(?P<budget_range>entre\s*(?P<range_min>\d+)[\s,]*y\s*(?P<range_max>\d+)\s*millones)'
+    r'|(?P<max_budget>(?:hasta|maximo|máximo)\s*(?P<max_value>\d+)\s*millones)'
+    r'|(?P<min_budget>(?:desde|minimo|mínimo)\s*(?P<min_value>\d+)\s*millones)'
+    r'|(?P<single_budget>(?P<single_value>\d+)\s*millones)'
+    r'|(?P<bedrooms>(?P<bedrooms_value>\d+)\s*(?:habitaciones|hab|habitación|cuartos|recámaras))'
+    r'|(?P<bathrooms>(?P<bathrooms_value>\d+)\s*(?:baños|baño))'
+    r'|(?P<apartment>\b(?:apartamento|apto|apartamentos)\b)'
+    r'|(?P<house>\b(?:casa|casas)\b)'
+)
+
+# Cheap check for whether a message can contain any preference at all
+# (numbers, property types, known locations or amenities), so turns like
+# "gracias" or "cuéntame más" skip extraction entirely
+_PREFERENCE_HINT_RE = re.compile(
+    r'\d|apart|apto|casa|' + '|'.join(map(re.escape, _LOCATIONS + _AMENITIES)),
+    re.IGNORECASE
+)
+
 def extract_client_preferences(message_history):
     """Extract client preferences from conversation history.
     
@@ -166,76 +312,308 @@ def extract_client_preferences(message_history):
         "amenities": []
     }
     
-    # Common Colombian neighborhoods and cities
-    locations = [
-        "chapinero", "usaquen", "chico", "cedritos", "salitre", 
-        "poblado", "laureles", "envigado", "sabaneta", "belen",
-        "bogota", "medellin", "cali", "barranquilla", "cartagena"
-    ]
-    
-    # Common amenities
-    amenities = [
-        "piscina", "gimnasio", "gym", "parqueadero", "parking", 
-        "terraza", "balcón", "balcon", "jardín", "jardin", 
-        "seguridad", "vigilancia", "ascensor", "bbq", "playground"
-    ]
-    
     # Extract user messages only
     user_messages = [msg["content"].lower() for msg in message_history if msg["role"] == "user"]
     
     # Join all messages for pattern matching
     conversation_text = " ".join(user_messages)
     
+    # Tokenize once (also accepting simple plurals) for set-based keyword lookups
+    tokens = set(_WORD_RE.findall(conversation_text))
+    tokens.update([token[:-1] for token in tokens if token.endswith("s")])
+    tokens.update([token[:-2] for token in tokens if token.endswith("es")])
+    
     # Extract locations
-    for location in locations:
-        if location in conversation_text:
-            preferences["locations"].append(location)
+    preferences["locations"] = [location for location in _LOCATIONS if location in tokens]
     
-    # Extract budget with regex
+    # Keep the first match of each kind, as separate searches would
+    matches = {}
+    for match in _PREFERENCE_RE.finditer(conversation_text):
+        matches.setdefault(match.lastgroup, match)
+    
+    # Extract budget
     # Format: X-Y millones, X millones, hasta Y millones
-    budget_range = re.search(r'entre\s*(\d+)[\s,]*y\s*(\d+)\s*millones', conversation_text)
-    if budget_range:
-        preferences["budget_min"] = int(budget_range.group(1)) * 1000000
-        preferences["budget_max"] = int(budget_range.group(2)) * 1000000
+    if "budget_range" in matches:
+        preferences["budget_min"] = int(matches["budget_range"].group("range_min")) * 1000000
+        preferences["budget_max"] = int(matches["budget_range"].group("range_max")) * 1000000
     else:
-        max_budget = re.search(r'(hasta|maximo|máximo)\s*(\d+)\s*millones', conversation_text)
-        if max_budget:
-            preferences["budget_max"] = int(max_budget.group(2)) * 1000000
+        if "max_budget" in matches:
+            preferences["budget_max"] = int(matches["max_budget"].group("max_value")) * 1000000
         
-        min_budget = re.search(r'(desde|minimo|mínimo)\s*(\d+)\s*millones', conversation_text)
-        if min_budget:
-            preferences["budget_min"] = int(min_budget.group(2)) * 1000000
+        if "min_budget" in matches:
+            preferences["budget_min"] = int(matches["min_budget"].group("min_value")) * 1000000
         
         # Single budget mention
-        single_budget = re.search(r'(\d+)\s*millones', conversation_text)
-        if single_budget and not preferences["budget_max"]:
+        if "single_budget" in matches and not preferences["budget_max"]:
             # Assume this is a maximum budget
-            preferences["budget_max"] = int(single_budget.group(1)) * 1000000
+            preferences["budget_max"] = int(matches["single_budget"].group("single_value")) * 1000000
     
     # Extract bedrooms
-    bedrooms = re.search(r'(\d+)\s*(?:habitaciones|hab|habitación|cuartos|recámaras)', conversation_text)
-    if bedrooms:
-        preferences["bedrooms"] = int(bedrooms.group(1))
+    if "bedrooms" in matches:
+        preferences["bedrooms"] = int(matches["bedrooms"].group("bedrooms_value"))
     
     # Extract bathrooms
-    bathrooms = re.search(r'(\d+)\s*(?:baños|baño)', conversation_text)
-    if bathrooms:
-        preferences["bathrooms"] = int(bathrooms.group(1))
+    if "bathrooms" in matches:
+        preferences["bathrooms"] = int(matches["bathrooms"].group("bathrooms_value"))
     
     # Extract property type
-    if re.search(r'\b(?:apartamento|apto|apartamentos)\b', conversation_text):
+    if "apartment" in matches:
         preferences["property_type"] = "apartamento"
-    elif re.search(r'\b(?:casa|casas)\b', conversation_text):
+    elif "house" in matches:
         preferences["property_type"] = "casa"
     
     # Extract amenities
-    for amenity in amenities:
-        if amenity in conversation_text:
-            preferences["amenities"].append(amenity)
+    preferences["amenities"] = [amenity for amenity in _AMENITIES if amenity in tokens]
     
     # Filter out empty preferences
     return {k: v for k, v in preferences.items() if v}
 
+class PropertySearchCallbackHandler(BaseCallbackHandler):
+    """Collect the property searches made during a single agent run.
+    
+    This lets the run record searches and shown properties in memory
+    without asking the executor to keep every intermediate step.
+    """
+    
+    run_inline = True
+    
+    def __init__(self):
+        self.searches = []
+        self._pending_queries = {}
+    
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        """Remember the query of a starting property search."""
+        if serialized.get("name") == "search_properties":
+            self._pending_queries[run_id] = kwargs.get("inputs") or input_str
+    
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        """Store the query and output of a finished property search."""
+        query = self._pending_queries.pop(run_id, None)
+        if query is not None:
+            self.searches.append((query, str(output)))
+    
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        """Forget a property search that failed."""
+        self._pending_queries.pop(run_id, None)
+
+class ReplyStreamCallbackHandler(AsyncCallbackHandler):
+    """Send the agent's reply in pieces while it is being generated.
+    
+    Streamed tokens are buffered and sent at paragraph breaks, or at the
+    last line or sentence break once the buffer grows past chunk_size, so
+    users start reading long replies (property lists) before the model
+    has finished them.
+    
+    A piece that can't be sent aborts the run (LangChain would otherwise
+    only log the error and carry on without that part of the reply), and
+    the error is kept in send_error for the caller to re-raise.
+    """
+    
+    raise_error = True
+    
+    def __init__(self, send, chunk_size=STREAM_CHUNK_SIZE):
+        self.send = send
+        self.chunk_size = chunk_size
+        self.sent = False
+        self.send_error = None
+        self._parts = []
+        self._length = 0
+    
+    async def _send(self, text):
+        """Send a non-empty piece of the reply."""
+        text = text.strip()
+        if text:
+            try:
+                await self.send(text)
+            except Exception as e:
+                self.send_error = e
+                raise
+            self.sent = True
+    
+    async def on_llm_new_token(self, token, **kwargs):
+        """Buffer a token and send every piece of the reply that is ready.
+        
+        Tokens are collected in a list and only joined when a break may
+        have arrived, instead of growing and rescanning one string on
+        every token.
+        """
+        self._parts.append(token)
+        self._length += len(token)
+        if "\n" not in token and self._length <= self.chunk_size:
+            return
+        
+        buffer = "".join(self._parts).lstrip()
+        while True:
+            cut = buffer.find("\n\n")
+            if cut == -1 and len(buffer) > self.chunk_size:
+                cut = max(buffer.rfind("\n"), buffer.rfind(". ") + 1)
+            if cut <= 0:
+                break
+            await self._send(buffer[:cut])
+            buffer = buffer[cut:].lstrip()
+        
+        self._parts = [buffer]
+        self._length = len(buffer)
+    
+    async def on_llm_end(self, response, **kwargs):
+        """Send whatever is left once a completion finishes."""
+        await self._send("".join(self._parts))
+        self._parts = []
+        self._length = 0
+
+# Links to property pages in search tool output
+_PROPERTY_LINK_RE = re.compile(r'https://lahaus\.com/properties/(\w+)')
+
+# First words that mark a message as a greeting
+_GREETINGS = frozenset({"hola", "buenos", "buenas", "saludos", "hey", "hi"})
+_GREETING_PUNCTUATION = "¡!¿?,.:;"
+
+def _is_greeting(user_input):
+    """Check whether a message is a greeting or too short to act on.
+    
+    Only the first word is inspected, so long messages aren't lowercased
+    or scanned as a whole.
+    
+    Args:
+        user_input: String containing the user's message
+        
+    Returns:
+        True if the message is a greeting or has fewer than three words
+    """
+    words = user_input.split(maxsplit=2)
+    if len(words) < 3:
+        return True
+    
+    return words[0].lower().strip(_GREETING_PUNCTUATION) in _GREETINGS
+
+# Reply sent when the agent fails to process a message
+AGENT_ERROR_MESSAGE = "Lo siento, estoy teniendo problemas para procesar tu solicitud en este momento. ¿Podrías intentarlo de nuevo o reformular tu pregunta?"
+
+def _exact_cache_key(agent, user_input):
+    """Get the exact-match cache key for a message, if it is cacheable.
+    
+    Only short first messages qualify, since their reply can't depend on
+    earlier turns.
+    
+    Args:
+        agent: The LangChain agent executor
+        user_input: String containing the user's message
+        
+    Returns:
+        The normalized message, or None if it shouldn't be cached
+    """
+    if len(user_input) > _EXACT_CACHE_MAX_LENGTH:
+        return None
+    if agent.memory and len(agent.memory.chat_memory.messages) > 1:
+        return None
+    return " ".join(user_input.lower().split()) or None
+
+def _start_agent_run(agent, user_input):
+    """Handle the cases that can be answered without invoking the agent.
+    
+    Args:
+        agent: The LangChain agent executor
+        user_input: String containing the user's message
+        
+    Returns:
+        Tuple of (early response or None, semantic cache to use or None,
+        exact-match cache key or None)
+    """
+    # Check if this is the first message (could be a greeting)
+    if agent.memory and len(agent.memory.chat_memory.messages) <= 1:
+        # If it's a greeting or very short first message, return welcome message
+        if _is_greeting(user_input):
+            return format_welcome_message(), None, None
+    
+    # Answer repeated short opening messages from the exact-match cache,
+    # then near-duplicate questions from the semantic cache, but only
+    # early in a conversation where context doesn't change the answer
+    _clear_stale_reply_caches()
+    exact_key = _exact_cache_key(agent, user_input)
+    cached_response = None
+    if exact_key:
+        with _exact_cache_lock:
+            cached_response = _exact_cache.get(exact_key)
+    
+    cache = None
+    if not cached_response and (not agent.memory or len(agent.memory.chat_memory.messages) <= SEMANTIC_CACHE_MAX_HISTORY):
+        cache = get_response_cache()
+    
+    if cache:
+        cached_response = cache.lookup(user_input)
+    
+    if cached_response:
+        if agent.memory:
+            agent.memory.save_context({"input": user_input}, {"output": cached_response})
+        return cached_response, None, None
+    
+    return None, cache, exact_key
+
+def _log_token_usage(cb):
+    """Log token usage and cost tracked by an OpenAI callback.
+    
+    Args:
+        cb: The OpenAI callback handler used during the agent run
+    """
+    # One record, formatted only if a sink accepts INFO; the values are
+    # also kept as structured fields in the record's extra dict
+    logger.info(
+        "LLM usage: {total_tokens} tokens ({prompt_tokens} prompt, {completion_tokens} completion), cost ${total_cost:.4f}",
+        total_tokens=cb.total_tokens,
+        prompt_tokens=cb.prompt_tokens,
+        completion_tokens=cb.completion_tokens,
+        total_cost=cb.total_cost
+    )
+
+def _finish_agent_run(agent, user_input, response, cache, exact_key, search_handler):
+    """Cache the response and update the specialized memory after a run.
+    
+    Args:
+        agent: The LangChain agent executor
+        user_input: String containing the user's message
+        response: The agent executor output
+        cache: Semantic cache to store the response in, or None
+        exact_key: Exact-match cache key to store the response under, or None
+        search_handler: Callback handler that collected the run's searches
+        
+    Returns:
+        The agent's response as a string
+    """
+    if exact_key:
+        with _exact_cache_lock:
+            _exact_cache[exact_key] = response['output']
+    if cache:
+        cache.add(user_input, response['output'])
+    
+    if agent.memory and len(agent.memory.chat_memory.messages) > 1:
+        # Extract preferences from the new message only; earlier messages
+        # were already merged into memory on previous turns
+        if _PREFERENCE_HINT_RE.search(user_input):
+            preferences = extract_client_preferences([{"role": "user", "content": user_input}])
+            if preferences and hasattr(agent.memory, 'update_user_preferences'):
+                agent.memory.update_user_preferences(preferences)
+            
+        # Record the property searches made during this run (the reply
+        # they were shown in is serialized once for all of them)
+        if hasattr(agent.memory, 'log_search') and search_handler.searches:
+            shown_at = orjson.dumps({"role": "assistant", "content": response['output']}).decode()
+            for query, output in search_handler.searches:
+                agent.memory.log_search(query)
+                
+                # Extract property IDs from tool output
+                property_links = _PROPERTY_LINK_RE.findall(output)
+                for prop_id in property_links:
+                    property_info = {"id": prop_id, "shown_at": shown_at}
+                    if hasattr(agent.memory, 'add_property_to_history'):
+                        agent.memory.add_property_to_history(property_info)
+    
+    # Log the conversation for analysis
+    logger.info("User: {}", user_input)
+    logger.info("Agent: {}", response['output'])
+    
+    # Return the formatted response
+    return response['output']
+
 def run_agent(agent, user_input):
     """Run the agent with a user input and return the response.
     
@@ -250,61 +628,85 @@ def run_agent(agent, user_input):
         The agent's response as a string
     """
     try:
-        # Check if this is the first message (could be a greeting)
-        is_first_message = False
-        if agent.memory and len(agent.memory.chat_memory.messages) <= 1:
-            is_first_message = True
-            
-            # If it's a greeting or very short first message, return welcome message
-            if len(user_input.split()) < 3 or any(greeting in user_input.lower() 
-                                              for greeting in ["hola", "buenos días", "buenas", "saludos"]):
-                return format_welcome_message()
+        early_response, cache, exact_key = _start_agent_run(agent, user_input)
+        if early_response is not None:
+            return early_response
         
         # Track token usage and performance
+        search_handler = PropertySearchCallbackHandler()
         with get_openai_callback() as cb:
             # Run the agent with the user input
-            response = agent.invoke({"input": user_input})
-            
-            # Log token usage
-            logger.info(f"Total Tokens: {cb.total_tokens}")
-            logger.info(f"Prompt Tokens: {cb.prompt_tokens}")
-            logger.info(f"Completion Tokens: {cb.completion_tokens}")
-            logger.info(f"Total Cost (USD): ${cb.total_cost}")
+            response = agent.invoke({"input": user_input}, config={"callbacks": [search_handler]})
+            _log_token_usage(cb)
         
-        # Extract client preferences if the message history is available
-        if agent.memory and len(agent.memory.chat_memory.messages) > 1:
-            chat_history = [{"role": "user" if i % 2 == 0 else "assistant", 
-                            "content": msg.content}
-                          for i, msg in enumerate(agent.memory.chat_memory.messages)]
-            
-            # Extract and save preferences to specialized memory if available
-            preferences = extract_client_preferences(chat_history)
-            if preferences and hasattr(agent.memory, 'update_user_preferences'):
-                agent.memory.update_user_preferences(preferences)
-                
-            # Check if any tool was used for property search
-            if hasattr(response, 'intermediate_steps') and response.intermediate_steps:
-                for step in response.intermediate_steps:
-                    if step[0].tool == "search_properties" and hasattr(agent.memory, 'log_search'):
-                        agent.memory.log_search(step[0].tool_input)
-                        
-                        # Extract property IDs from tool output
-                        property_links = re.findall(r'https://lahaus.com/properties/(\w+)', step[1])
-                        for prop_id in property_links:
-                            property_info = {"id": prop_id, "shown_at": json.dumps({"role": "assistant", "content": response['output']})}
-                            if hasattr(agent.memory, 'add_property_to_history'):
-                                agent.memory.add_property_to_history(property_info)
+        return _finish_agent_run(agent, user_input, response, cache, exact_key, search_handler)
         
-        # Log the conversation for analysis
-        logger.info(f"User: {user_input}")
-        logger.info(f"Agent: {response['output']}")
+    except Exception as e:
+        logger.error(f"Error running agent: {str(e)}")
+        return AGENT_ERROR_MESSAGE
+
+async def run_agent_async(agent, user_input, on_chunk=None):
+    """Run the agent without blocking the event loop.
+    
+    Async counterpart of run_agent: the agent runs through ainvoke, and the
+    blocking pre/post processing (embedding lookups, memory bookkeeping)
+    runs in a worker thread. The bookkeeping after a run happens once the
+    reply has been sent through on_chunk, and if a piece of the reply can't
+    be sent, the error raised by on_chunk is raised from here.
+    
+    Args:
+        agent: The LangChain agent executor
+        user_input: String containing the user's message
+        on_chunk: Optional coroutine function called with each piece of the
+            reply as soon as it is ready; when given, the whole reply
+            (including greetings, cached answers and errors) is delivered
+            through it
         
-        # Return the formatted response
-        return response['output']
+    Returns:
+        The agent's response as a string
+    """
+    stream_handler = ReplyStreamCallbackHandler(on_chunk) if on_chunk else None
+    response = None
+    
+    try:
+        early_response, cache, exact_key = await asyncio.to_thread(_start_agent_run, agent, user_input)
+        if early_response is not None:
+            response_text = early_response
+        else:
+            # Track token usage and performance
+            search_handler = PropertySearchCallbackHandler()
+            callbacks = [search_handler, stream_handler] if stream_handler else [search_handler]
+            with get_openai_callback() as cb:
+                # Run the agent with the user input
+                response = await agent.ainvoke({"input": user_input}, config={"callbacks": callbacks})
+                _log_token_usage(cb)
+            
+            response_text = response['output']
         
     except Exception as e:
+        # Part of the reply couldn't be delivered; leave it to the caller
+        if stream_handler and stream_handler.send_error is not None:
+            raise stream_handler.send_error
+        
         logger.error(f"Error running agent: {str(e)}")
-        return "Lo siento, estoy teniendo problemas para procesar tu solicitud en este momento. ¿Podrías intentarlo de nuevo o reformular tu pregunta?"
+        response = None
+        response_text = AGENT_ERROR_MESSAGE
+    
+    # Send the reply in one piece if nothing was streamed
+    if stream_handler and (not stream_handler.sent or response_text is AGENT_ERROR_MESSAGE):
+        await on_chunk(response_text)
+    
+    # Caching, preference extraction and logging don't change the reply,
+    # so they only run once it has been sent
+    if response is not None:
+        try:
+            await asyncio.to_thread(
+                _finish_agent_run, agent, user_input, response, cache, exact_key, search_handler
+            )
+        except Exception as e:
+            logger.error(f"Error updating memory after agent run: {str(e)}")
+    
+    return response_text
 
 def analyze_conversation(conversation_history):
     """Analyze the conversation to identify patterns and provide insights.
@@ -332,12 +734,12 @@ def analyze_conversation(conversation_history):
     assistant_lengths = []
     
     for message in conversation_history:
-        if message["role"] == "user":
+        if message.role == "user":
             analysis["user_messages"] += 1
-            user_lengths.append(len(message["content"]))
-        elif message["role"] == "assistant":
+            user_lengths.append(len(message.content))
+        elif message.role == "assistant":
             analysis["assistant_messages"] += 1
-            assistant_lengths.append(len(message["content"]))
+            assistant_lengths.append(len(message.content))
     
     if user_lengths:
         analysis["average_user_message_length"] = sum(user_lengths) / len(user_lengths)
@@ -346,6 +748,6 @@ def analyze_conversation(conversation_history):
         analysis["average_assistant_message_length"] = sum(assistant_lengths) / len(assistant_lengths)
     
     # Extract client preferences
-    analysis["preferences"] = extract_client_preferences(conversation_history)
+    analysis["preferences"] = extract_client_preferences([message._asdict() for message in conversation_history])
     
     return analysis
\ No newline at end of file
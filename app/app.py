@@ -1,107 +1,230 @@
-from flask import Flask, request, jsonify, render_template
-from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
+from quart import Quart, request, jsonify, stream_template
+from quart.json.provider import DefaultJSONProvider
+from cachetools import TTLCache
 from loguru import logger
+import asyncio
+import functools
+import httpx
+import itertools
+import orjson
 import os
 import json
 import time
-import uuid
+import weakref
 
-from .agent import create_agent, run_agent, analyze_conversation
-from .utils import format_whatsapp_message, log_conversation
+from .agent import create_agent, run_agent_async, analyze_conversation
+from .utils import format_whatsapp_message, log_conversation, setup_logging
+from .store import ConversationMessage, create_conversation_store
 from .config import (
     TWILIO_ACCOUNT_SID, 
     TWILIO_AUTH_TOKEN, 
     DEBUG_MODE, 
     PORT, 
-    MAX_CONVERSATION_HISTORY
+    LOG_DIR,
+    LOG_LEVEL,
+    LOG_ROTATION,
+    MAX_AGENT_SESSIONS,
+    AGENT_SESSION_TTL,
+    MESSAGE_BATCH_WINDOW
 )
 
-# Initialize Flask app
-app = Flask(__name__)
+# Dashboard templates live at the repository root
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
 
-# Dictionary to store conversation contexts per user
-conversation_contexts = {}
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes responses with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Initialize Quart app (async, so a slow LLM call doesn't block other webhooks)
+app = Quart(__name__, template_folder=TEMPLATES_DIR)
+app.json = OrjsonProvider(app)
+
+# Conversation contexts, preferences and metrics per user (in memory, or
+# in Redis when REDIS_URL is set so several workers can share them)
+conversation_store = create_conversation_store()
+
+# Agent executors per user; each one keeps its running memory between
+# messages, and idle sessions are evicted so they don't pile up
+agent_instances = TTLCache(maxsize=MAX_AGENT_SESSIONS, ttl=AGENT_SESSION_TTL)
+
+# Messages waiting to be answered per user; fragments sent in quick
+# succession are answered together with a single agent run
+pending_messages = {}
+
+# Per-user locks so a user's turns are processed one at a time (entries
+# disappear once no task holds the lock)
+sender_locks = weakref.WeakValueDictionary()
+
+# Replies are sent through the REST API, so the webhook always answers
+# with the same empty TwiML document (written out so the twilio package
+# isn't imported at startup)
+EMPTY_TWIML_RESPONSE = '<?xml version="1.0" encoding="UTF-8"?><Response />'
+
+# Users listed per dashboard page
+DASHBOARD_PAGE_SIZE = 50
+
+# Rendered template chunks joined into each piece of the streamed dashboard
+DASHBOARD_STREAM_BUFFER = 10
+
+# Reply sent when a message can't be processed
+PROCESSING_ERROR_MESSAGE = "Lo siento, estoy teniendo problemas técnicos en este momento. ¿Podrías intentarlo de nuevo en unos momentos?"
 
-# Dictionary to store agent instances per user
-agent_instances = {}
+# Message IDs only need to be unique within the app, so they are a
+# per-process prefix (pid and start time) plus a counter
+_MESSAGE_ID_PREFIX = f"{os.getpid():x}-{int(time.time()):x}"
+_message_id_counter = itertools.count()
 
-# Dictionary to store metrics
-conversation_metrics = {}
+def new_message_id():
+    """Return a new unique message ID"""
+    return f"{_MESSAGE_ID_PREFIX}-{next(_message_id_counter):x}"
+
+# Twilio Messages API endpoint used to send replies
+TWILIO_API_URL = "https://api.twilio.com"
+TWILIO_MESSAGES_PATH = f"/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+
+# HTTP client used to send replies, created on first use and kept open so
+# every message reuses the same pooled HTTP/2 connection
+_twilio_http = None
+
+def get_twilio_http():
+    """Get the shared Twilio HTTP client, creating it if needed"""
+    global _twilio_http
+    if _twilio_http is None:
+        _twilio_http = httpx.AsyncClient(
+            base_url=TWILIO_API_URL,
+            auth=(TWILIO_ACCOUNT_SID or "", TWILIO_AUTH_TOKEN or ""),
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=100),
+            timeout=15.0
+        )
+    return _twilio_http
+
+async def send_whatsapp_message(to_number, from_number, body):
+    """Send a WhatsApp message through the Twilio REST API"""
+    response = await get_twilio_http().post(
+        TWILIO_MESSAGES_PATH,
+        data={"To": to_number, "From": from_number, "Body": body}
+    )
+    response.raise_for_status()
+
+@app.after_serving
+async def close_twilio_http():
+    """Close the Twilio HTTP client when the server shuts down"""
+    global _twilio_http
+    if _twilio_http is not None:
+        await _twilio_http.aclose()
+        _twilio_http = None
 
 @app.route('/webhook', methods=['POST'])
-def webhook():
-    """Webhook endpoint for receiving WhatsApp messages via Twilio"""
-    # Get incoming message details
-    incoming_msg = request.values.get('Body', '').strip()
-    sender = request.values.get('From', '')
-    media_url = request.values.get('MediaUrl0', None)
+async def webhook():
+    """Webhook endpoint for receiving WhatsApp messages via Twilio
     
-    # Generate a unique message ID
-    message_id = str(uuid.uuid4())
+    The message is queued and answered through the REST API once the
+    user stops typing for MESSAGE_BATCH_WINDOW seconds, so the webhook
+    itself returns an empty TwiML response right away.
+    """
+    # Get incoming message details
+    form = await request.form
+    incoming_msg = form.get('Body', '').strip()
+    sender = form.get('From', '')
+    bot_number = form.get('To', '')
+    media_url = form.get('MediaUrl0', None)
     timestamp = time.time()
     
-    logger.info(f"Received message from {sender} [{message_id}]: {incoming_msg}")
-    
-    # Get or create conversation context for this user
-    if sender not in conversation_contexts:
-        conversation_contexts[sender] = []
-        conversation_metrics[sender] = {
-            "total_messages": 0,
-            "total_tokens": 0,
-            "session_start": timestamp,
-            "last_activity": timestamp
-        }
-    else:
-        conversation_metrics[sender]["last_activity"] = timestamp
+    logger.info(f"Received message from {sender}: {incoming_msg}")
     
     # Update metrics
-    conversation_metrics[sender]["total_messages"] += 1
+    await conversation_store.record_incoming_message(sender, timestamp)
     
     # Handle media if present
     message_content = incoming_msg
     if media_url:
         message_content = f"{incoming_msg} [Media: {media_url}]"
     
-    # Append user message to context
-    user_message = {"role": "user", "content": message_content, "timestamp": timestamp, "id": message_id}
-    conversation_contexts[sender].append(user_message)
+    # Queue the message, starting a batch window if none is open
+    fragments = pending_messages.get(sender)
+    if fragments is None:
+        pending_messages[sender] = [message_content]
+        app.add_background_task(flush_pending_messages, sender, bot_number)
+    else:
+        fragments.append(message_content)
+    
+    return EMPTY_TWIML_RESPONSE
+
+async def flush_pending_messages(sender, bot_number):
+    """Answer every message a user sent during the batch window at once"""
+    await asyncio.sleep(MESSAGE_BATCH_WINDOW)
     
-    # Limit conversation history
-    if len(conversation_contexts[sender]) > MAX_CONVERSATION_HISTORY * 2:  # *2 because we count pairs of messages
-        conversation_contexts[sender] = conversation_contexts[sender][-MAX_CONVERSATION_HISTORY * 2:]
+    # Messages arriving from now on open a new batch window
+    message_content = "\n".join(pending_messages.pop(sender))
+    
+    lock = sender_locks.get(sender)
+    if lock is None:
+        lock = asyncio.Lock()
+        sender_locks[sender] = lock
+    
+    async with lock:
+        await process_message(sender, bot_number, message_content)
+
+async def process_message(sender, bot_number, message_content):
+    """Run the agent on a user's message and send the reply via Twilio"""
+    # Generate a message ID
+    message_id = new_message_id()
+    
+    # Read the wall clock once; later timestamps are derived from the
+    # monotonic perf_counter
+    timestamp = time.time()
+    started = time.perf_counter()
     
     # Process with AI agent
     try:
-        # Get or create agent
-        if sender not in agent_instances:
-            agent_instances[sender] = create_agent(conversation_contexts[sender])
+        # Reuse the cached agent; only rebuild it (replaying the stored
+        # history and preferences) when the session is new or was evicted
+        agent = agent_instances.get(sender)
+        if agent is None:
+            agent = create_agent(await conversation_store.get_history(sender))
+            preferences = await conversation_store.get_preferences(sender)
+            if preferences:
+                agent.memory.update_user_preferences(preferences)
+            agent_instances[sender] = agent
         
-        # Process message
-        start_time = time.time()
-        response = run_agent(agent_instances[sender], message_content)
-        processing_time = time.time() - start_time
+        # Process message, sending the reply to WhatsApp piece by piece
+        # as it is generated
+        async def send_reply(chunk):
+            await send_whatsapp_message(sender, bot_number, format_whatsapp_message(chunk))
         
-        # Generate response ID
-        response_id = str(uuid.uuid4())
-        response_timestamp = time.time()
-        
-        # Add assistant response to context
-        assistant_message = {
-            "role": "assistant", 
-            "content": response, 
-            "timestamp": response_timestamp,
-            "id": response_id,
-            "processing_time": processing_time
-        }
-        conversation_contexts[sender].append(assistant_message)
+        run_started = time.perf_counter()
+        response = await run_agent_async(agent, message_content, on_chunk=send_reply)
+        finished = time.perf_counter()
+        processing_time = finished - run_started
         
-        # Format response for WhatsApp
-        formatted_response = format_whatsapp_message(response)
+        # Generate response ID
+        response_id = new_message_id()
+        response_timestamp = timestamp + (finished - started)
         
-        # Create Twilio response
-        twilio_resp = MessagingResponse()
-        twilio_resp.message(formatted_response)
+        # Store the turn and preferences in a single update (the store
+        # keeps only the most recent MAX_CONVERSATION_HISTORY pairs of messages)
+        user_message = ConversationMessage("user", message_content, timestamp, message_id)
+        assistant_message = ConversationMessage(
+            "assistant",
+            response,
+            response_timestamp,
+            response_id,
+            processing_time
+        )
+        await conversation_store.record_turn(
+            sender, user_message, assistant_message, agent.memory.user_preferences
+        )
         
         # Log conversation for analysis
         log_conversation(
@@ -112,56 +235,93 @@ def webhook():
         )
         
         logger.info(f"Sent response to {sender} [{response_id}] in {processing_time:.2f}s")
-        return str(twilio_resp)
     
     except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        # Return a friendly error message
-        twilio_resp = MessagingResponse()
-        twilio_resp.message("Lo siento, estoy teniendo problemas técnicos en este momento. ¿Podrías intentarlo de nuevo en unos momentos?")
-        return str(twilio_resp)
+        logger.error(f"Error processing message [{message_id}]: {str(e)}")
+        # Send a friendly error message
+        try:
+            await send_whatsapp_message(sender, bot_number, PROCESSING_ERROR_MESSAGE)
+        except Exception as send_error:
+            logger.error(f"Error sending error message to {sender}: {str(send_error)}")
+
+@functools.lru_cache(maxsize=4096)
+def format_timestamp(seconds):
+    """Format a Unix timestamp (whole seconds) as local date and time"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+@functools.lru_cache(maxsize=None)
+def get_dashboard_template():
+    """Get the compiled dashboard template, loading it on first use"""
+    return app.jinja_env.get_template('dashboard.html')
+
+async def buffer_chunks(chunks, size=DASHBOARD_STREAM_BUFFER):
+    """Join a stream of small template chunks into larger pieces.
+    
+    Args:
+        chunks: Async iterator of rendered template strings
+        size: Number of chunks sent together
+    """
+    buffer = []
+    async for chunk in chunks:
+        buffer.append(chunk)
+        if len(buffer) >= size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
 
 @app.route('/health', methods=['GET'])
-def health_check():
+async def health_check():
     """Simple health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "active_conversations": len(conversation_contexts),
-        "total_messages_processed": sum(m["total_messages"] for m in conversation_metrics.values())
+        "active_conversations": await conversation_store.count_conversations(),
+        "total_messages_processed": await conversation_store.total_messages()
     })
 
 @app.route('/dashboard', methods=['GET'])
-def dashboard():
+async def dashboard():
     """Admin dashboard for monitoring the system"""
     if DEBUG_MODE:
+        # Totals come from counters; per-user rows are fetched one page at a time
+        page = max(request.args.get('page', 1, type=int), 1)
+        conversation_metrics = await conversation_store.get_metrics(
+            offset=(page - 1) * DASHBOARD_PAGE_SIZE, limit=DASHBOARD_PAGE_SIZE
+        )
         stats = {
-            "active_conversations": len(conversation_contexts),
-            "total_users": len(conversation_metrics),
-            "total_messages": sum(m["total_messages"] for m in conversation_metrics.values()),
-            "user_stats": []
+            "active_conversations": await conversation_store.count_conversations(),
+            "total_users": await conversation_store.count_users(),
+            "total_messages": await conversation_store.total_messages(),
+            "page": page,
+            "has_next_page": len(conversation_metrics) == DASHBOARD_PAGE_SIZE
         }
         
-        for user_id, metrics in conversation_metrics.items():
-            user_stats = {
+        conversation_lengths = await conversation_store.conversation_lengths(conversation_metrics)
+        
+        # Rows are built as the template reaches them
+        stats["user_stats"] = (
+            {
                 "user_id": user_id,
                 "message_count": metrics["total_messages"],
-                "conversation_length": len(conversation_contexts.get(user_id, [])),
-                "last_activity": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metrics["last_activity"]))
+                "conversation_length": conversation_length,
+                "last_activity": format_timestamp(int(metrics["last_activity"]))
             }
-            stats["user_stats"].append(user_stats)
+            for (user_id, metrics), conversation_length in zip(conversation_metrics.items(), conversation_lengths)
+        )
         
-        return render_template('dashboard.html', stats=stats)
+        # Stream the page so the client receives it while it is rendered
+        chunks = await stream_template(get_dashboard_template(), stats=stats)
+        return buffer_chunks(chunks), {"Content-Type": "text/html; charset=utf-8"}
     else:
         return jsonify({"error": "Dashboard only available in debug mode"})
 
 @app.route('/reset/<user_id>', methods=['POST'])
-def reset_conversation(user_id):
+async def reset_conversation(user_id):
     """Reset a user's conversation context"""
     if DEBUG_MODE:
-        if user_id in conversation_contexts:
-            conversation_contexts[user_id] = []
-            if user_id in agent_instances:
-                del agent_instances[user_id]
+        if await conversation_store.has_conversation(user_id):
+            await conversation_store.clear(user_id)
+            agent_instances.pop(user_id, None)
             return jsonify({"status": "success", "message": f"Conversation reset for {user_id}"})
         else:
             return jsonify({"status": "error", "message": "User not found"})
@@ -169,11 +329,11 @@ def reset_conversation(user_id):
         return jsonify({"error": "Reset only available in debug mode"})
 
 @app.route('/analyze/<user_id>', methods=['GET'])
-def analyze_user_conversation(user_id):
+async def analyze_user_conversation(user_id):
     """Analyze a user's conversation"""
     if DEBUG_MODE:
-        if user_id in conversation_contexts:
-            analysis = analyze_conversation(conversation_contexts[user_id])
+        if await conversation_store.has_conversation(user_id):
+            analysis = analyze_conversation(await conversation_store.get_history(user_id))
             return jsonify(analysis)
         else:
             return jsonify({"status": "error", "message": "User not found"})
@@ -181,12 +341,15 @@ def analyze_user_conversation(user_id):
         return jsonify({"error": "Analysis only available in debug mode"})
 
 def init_app():
-    """Initialize the Flask application with required directories"""
+    """Initialize the Quart application with required directories"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    setup_logging(LOG_DIR, LOG_LEVEL, LOG_ROTATION)
+    
     # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
+    os.makedirs(TEMPLATES_DIR, exist_ok=True)
     
     # Create a basic dashboard template if it doesn't exist
-    dashboard_template = os.path.join('templates', 'dashboard.html')
+    dashboard_template = os.path.join(TEMPLATES_DIR, 'dashboard.html')
     if not os.path.exists(dashboard_template):
         with open(dashboard_template, 'w') as f:
             f.write("""
@@ -0,0 +1,125 @@
+from typing import Callable, List, Optional
+import threading
+import numpy as np
+import orjson
+from loguru import logger
+
+from .search import extract_filters
+
+class SemanticResponseCache:
+    """Cache of agent responses looked up by query embedding similarity.
+
+    Near-duplicate questions ("¿tienes apartamentos en Chapinero?" vs
+    "busco apto en chapinero") are answered from the cache instead of a
+    full agent round-trip. A hit requires both a cosine similarity above
+    the threshold and the same extracted search filters, so queries that
+    only differ in budget, rooms or location never share an answer.
+
+    Embeddings are kept normalized in a fixed-size matrix used as a ring
+    buffer, so a lookup is a single matrix-vector product. The cache is
+    shared by worker threads; embedding happens outside its lock.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], List[float]],
+        threshold: float = 0.92,
+        max_entries: int = 1000
+    ):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._filter_keys: List[bytes] = []
+        self._responses: List[str] = []
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._filter_keys.clear()
+            self._responses.clear()
+            self._next_slot = 0
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Lowercase the query and collapse whitespace."""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _filter_key(query: str) -> bytes:
+        """Build a hashable key from the filters extracted from a query."""
+        return orjson.dumps(extract_filters(query), option=orjson.OPT_SORT_KEYS)
+
+    def _embed(self, query: str) -> np.ndarray:
+        """Embed a normalized query as a unit vector."""
+        vector = np.asarray(self.embed_fn(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Return a cached response for a semantically equivalent query.
+
+        Args:
+            query: The user's message
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        if not self._responses:
+            return None
+
+        normalized_query = self._normalize_query(query)
+        try:
+            vector = self._embed(normalized_query)
+        except Exception as e:
+            logger.error(f"Error embedding query for cache lookup: {str(e)}")
+            return None
+
+        filter_key = self._filter_key(normalized_query)
+        with self._lock:
+            scores = self._vectors[:len(self._responses)] @ vector
+
+            # Check the candidates above the threshold, most similar first
+            # (only those are sorted, not the whole cache)
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for index in candidates[np.argsort(-scores[candidates])]:
+                if self._filter_keys[index] == filter_key:
+                    logger.info(f"Semantic cache hit (similarity {scores[index]:.3f})")
+                    return self._responses[index]
+
+        return None
+
+    def add(self, query: str, response: str) -> None:
+        """Store a response for a query, evicting the oldest entry when full.
+
+        Args:
+            query: The user's message
+            response: The agent's response to cache
+        """
+        normalized_query = self._normalize_query(query)
+        try:
+            vector = self._embed(normalized_query)
+        except Exception as e:
+            logger.error(f"Error embedding query for cache insert: {str(e)}")
+            return
+
+        filter_key = self._filter_key(normalized_query)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            slot = self._next_slot
+            self._vectors[slot] = vector
+            if slot < len(self._responses):
+                self._filter_keys[slot] = filter_key
+                self._responses[slot] = response
+            else:
+                self._filter_keys.append(filter_key)
+                self._responses.append(response)
+
+            self._next_slot = (slot + 1) % self.max_entries
@@ -1,8 +1,13 @@
 import os
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from the project's .env file. The path is
+# given explicitly so python-dotenv doesn't search parent directories, and
+# processes started from an already configured one (workers, test
+# subprocesses) inherit the variables and skip the file entirely.
+if not os.environ.get('_SAM_CONFIG_LOADED'):
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+    os.environ['_SAM_CONFIG_LOADED'] = '1'
 
 # API Keys
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -11,26 +16,59 @@ TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 
 # AI Model configuration
 MODEL_NAME = os.getenv('MODEL_NAME', 'gpt-4o')
+SUMMARY_MODEL_NAME = os.getenv('SUMMARY_MODEL_NAME', 'gpt-4o-mini')  # Cheaper model for memory summaries
 TEMPERATURE = float(os.getenv('TEMPERATURE', '0.5'))
 MAX_TOKENS = int(os.getenv('MAX_TOKENS', '4096'))
 FREQUENCY_PENALTY = float(os.getenv('FREQUENCY_PENALTY', '0.0'))
 PRESENCE_PENALTY = float(os.getenv('PRESENCE_PENALTY', '0.0'))
 
+# Agent debugging (verbose console output and kept intermediate steps)
+AGENT_VERBOSE = os.getenv('AGENT_VERBOSE', 'False').lower() == 'true'
+AGENT_RETURN_INTERMEDIATE_STEPS = os.getenv('AGENT_RETURN_INTERMEDIATE_STEPS', 'False').lower() == 'true'
+
 # Application configuration
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
 PORT = int(os.getenv('PORT', 5000))
 
+# Optional Redis URL for sharing conversation state between workers
+# (conversations are kept in process memory when unset)
+REDIS_URL = os.getenv('REDIS_URL', '')
+
 # Paths
 DATA_DIR = os.getenv('DATA_DIR', 'data')
 LOG_DIR = os.getenv('LOG_DIR', 'logs')
 
+# Logging
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_ROTATION = os.getenv('LOG_ROTATION', '10 MB')  # Size at which the app log file is rotated
+
 # Default property search parameters
 DEFAULT_SEARCH_LIMIT = int(os.getenv('DEFAULT_SEARCH_LIMIT', 5))
 MAX_PROPERTIES_PER_RESPONSE = int(os.getenv('MAX_PROPERTIES_PER_RESPONSE', 3))
 
 # Conversation parameters
 MAX_CONVERSATION_HISTORY = int(os.getenv('MAX_CONVERSATION_HISTORY', 10))
-SUMMARY_INTERVAL = int(os.getenv('SUMMARY_INTERVAL', 5))  # Summarize after this many messages
+MAX_CONVERSATIONS = int(os.getenv('MAX_CONVERSATIONS', 5000))  # Stored conversations kept in process memory
+CONVERSATION_TTL = int(os.getenv('CONVERSATION_TTL', 86400))  # Seconds before an idle conversation is dropped
+SUMMARY_TOKEN_LIMIT = int(os.getenv('SUMMARY_TOKEN_LIMIT', 1500))  # Summarize older messages past this many tokens
+MESSAGE_BATCH_WINDOW = float(os.getenv('MESSAGE_BATCH_WINDOW', '1.5'))  # Seconds to wait for more message fragments
+
+# Response streaming (replies are sent in pieces as they are generated;
+# OpenAI does not report token usage for streamed completions)
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'True').lower() == 'true'
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 200))  # Characters buffered before sending at a line/sentence break
+
+# Semantic response cache parameters
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True').lower() == 'true'
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'text-embedding-3-small')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', 1000))
+SEMANTIC_CACHE_MAX_HISTORY = int(os.getenv('SEMANTIC_CACHE_MAX_HISTORY', 10))  # Skip cache in longer conversations
+EXACT_CACHE_SIZE = int(os.getenv('EXACT_CACHE_SIZE', 1000))  # Cached replies to short opening messages
+
+# Session cache parameters (idle agent sessions are evicted after the TTL)
+MAX_AGENT_SESSIONS = int(os.getenv('MAX_AGENT_SESSIONS', 10000))
+AGENT_SESSION_TTL = int(os.getenv('AGENT_SESSION_TTL', 3600))  # Seconds
 
 # Initialize configuration
 def init_config():
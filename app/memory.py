@@ -1,59 +1,83 @@
-from typing import Dict, List, Any, Optional
-from langchain.memory import ConversationBufferMemory
+from typing import Dict, List, Any, Set
+from array import array
+from enum import IntEnum
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.pydantic_v1 import Field, PrivateAttr
 from langchain.schema import BaseMemory
-from langchain_openai import ChatOpenAI
 from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.schema.messages import BaseMessage, HumanMessage, AIMessage
-import json
+from langchain.schema.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, get_buffer_string
+from langchain.chains import LLMChain
+import orjson
 from loguru import logger
 
-from .config import MAX_CONVERSATION_HISTORY, SUMMARY_INTERVAL
+from .config import SUMMARY_TOKEN_LIMIT
 
-class PropertyConciergeMemory(ConversationBufferMemory):
+class EngagementMetric(IntEnum):
+    """Position of each engagement counter in PropertyConciergeMemory."""
+    MESSAGE_COUNT = 0
+    SEARCH_COUNT = 1
+    PROPERTY_CLICKS = 2
+    INTEREST_INDICATORS = 3
+
+def _new_engagement_counters() -> array:
+    """Return zeroed engagement counters, one per EngagementMetric."""
+    return array('Q', bytes(8 * len(EngagementMetric)))
+
+class PropertyConciergeMemory(ConversationSummaryBufferMemory):
     """Custom memory class for the LaHaus property concierge.
     
-    This memory extends ConversationBufferMemory with additional
+    This memory extends ConversationSummaryBufferMemory with additional
     specialized storage for property-related information:
     1. User preferences
     2. Property viewing history
     3. Engagement metrics
     
-    It also provides summarization after a certain number of messages.
+    Once the raw message buffer exceeds max_token_limit, the oldest
+    messages are folded into a running summary, so the prompt size stays
+    bounded no matter how long the conversation gets.
+    
+    The summary and known preferences are returned under context_key,
+    separately from the message buffer, so the prompt can place them after
+    the conversation and keep the earlier part of every request identical
+    (which is what OpenAI's automatic prompt caching matches on).
     """
     
-    def __init__(
-        self,
-        llm: Optional[ChatOpenAI] = None,
-        memory_key: str = "chat_history",
-        return_messages: bool = True,
-        human_prefix: str = "Human",
-        ai_prefix: str = "AI",
-        **kwargs
-    ):
-        super().__init__(
-            memory_key=memory_key,
-            return_messages=return_messages,
-            human_prefix=human_prefix,
-            ai_prefix=ai_prefix
-        )
-        self.llm = llm
-        self.user_preferences = {}
-        self.property_history = []
-        self.engagement_metrics = {
-            "message_count": 0,
-            "search_count": 0,
-            "property_clicks": 0,
-            "interest_indicators": 0
-        }
+    memory_key: str = "chat_history"
+    context_key: str = "dynamic_context"
+    return_messages: bool = True
+    max_token_limit: int = SUMMARY_TOKEN_LIMIT
+    user_preferences: Dict[str, Any] = Field(default_factory=dict)
+    property_history: List[Dict[str, Any]] = Field(default_factory=list)
+    
+    # IDs in property_history, for O(1) duplicate checks
+    _history_ids: Set[str] = PrivateAttr(default_factory=set)
+    
+    # Engagement counters in one flat array, indexed by EngagementMetric
+    _engagement: array = PrivateAttr(default_factory=_new_engagement_counters)
+    
+    @property
+    def engagement_metrics(self) -> Dict[str, int]:
+        """Engagement counters by name (message_count, search_count, ...)."""
+        return {metric.name.lower(): self._engagement[metric] for metric in EngagementMetric}
     
     def update_user_preferences(self, preferences: Dict[str, Any]) -> None:
         """Update user preferences based on conversation.
         
+        List preferences (locations, amenities) are merged with the ones
+        already known; other values replace the previous ones.
+        
         Args:
             preferences: Dictionary of user preferences
         """
-        self.user_preferences.update(preferences)
-        logger.info(f"Updated user preferences: {json.dumps(self.user_preferences, ensure_ascii=False)}")
+        for key, value in preferences.items():
+            known = self.user_preferences.get(key)
+            if isinstance(value, list) and isinstance(known, list):
+                self.user_preferences[key] = known + [item for item in value if item not in known]
+            else:
+                self.user_preferences[key] = value
+        logger.opt(lazy=True).info(
+            "Updated user preferences: {}", lambda: orjson.dumps(self.user_preferences).decode()
+        )
     
     def add_property_to_history(self, property_info: Dict[str, Any]) -> None:
         """Add a property to the history of shown properties.
@@ -63,8 +87,8 @@ class PropertyConciergeMemory(ConversationBufferMemory):
         """
         if property_info and "id" in property_info:
             # Check if property is already in history
-            existing_ids = [p.get("id") for p in self.property_history]
-            if property_info["id"] not in existing_ids:
+            if property_info["id"] not in self._history_ids:
+                self._history_ids.add(property_info["id"])
                 self.property_history.append(property_info)
                 logger.info(f"Added property {property_info['id']} to history")
     
@@ -74,7 +98,7 @@ class PropertyConciergeMemory(ConversationBufferMemory):
         Args:
             property_id: ID of the property that was clicked
         """
-        self.engagement_metrics["property_clicks"] += 1
+        self._engagement[EngagementMetric.PROPERTY_CLICKS] += 1
         logger.info(f"User clicked on property {property_id}")
     
     def log_search(self, query: str) -> None:
@@ -83,82 +107,163 @@ class PropertyConciergeMemory(ConversationBufferMemory):
         Args:
             query: The search query
         """
-        self.engagement_metrics["search_count"] += 1
+        self._engagement[EngagementMetric.SEARCH_COUNT] += 1
         logger.info(f"Search performed: {query}")
     
-    def _summarize_older_messages(self) -> None:
-        """Summarize older messages to prevent context window overflow."""
-        if len(self.chat_memory.messages) <= MAX_CONVERSATION_HISTORY * 2:
-            return
-            
-        # Keep the most recent messages intact
-        recent_messages = self.chat_memory.messages[-MAX_CONVERSATION_HISTORY * 2:]
-        older_messages = self.chat_memory.messages[:-MAX_CONVERSATION_HISTORY * 2]
+    @property
+    def memory_variables(self) -> List[str]:
+        """Return the variables this memory provides to the prompt."""
+        return [self.memory_key, self.context_key]
+    
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the message buffer and the dynamic context separately.
         
-        if not older_messages or not self.llm:
-            return
-            
-        # Create a summary of older messages
-        try:
-            from langchain_community.memory import ConversationSummaryMemory
-            summary_memory = ConversationSummaryMemory(llm=self.llm)
-            
-            # Add message pairs to the summary memory
-            for i in range(0, len(older_messages), 2):
-                if i + 1 < len(older_messages):
-                    human_msg = older_messages[i]
-                    ai_msg = older_messages[i + 1]
-                    if isinstance(human_msg, HumanMessage) and isinstance(ai_msg, AIMessage):
-                        summary_memory.save_context(
-                            {"input": human_msg.content},
-                            {"output": ai_msg.content}
-                        )
-            
-            # Get the summary
-            summary = summary_memory.load_memory_variables({})
-            
-            # Create a system message with the summary
-            from langchain.schema.messages import SystemMessage
-            summary_msg = SystemMessage(content=f"Previous conversation summary: {summary}")
-            
-            # Update chat memory with summary + recent messages
-            self.chat_memory.messages = [summary_msg] + recent_messages
+        Args:
+            inputs: Dictionary of inputs
             
-            logger.info(f"Summarized {len(older_messages)} older messages")
+        Returns:
+            Dictionary with the message buffer under memory_key and the
+            running summary and known preferences under context_key
+        """
+        context: List[BaseMessage] = []
+        if self.moving_summary_buffer:
+            context.append(SystemMessage(content=self.moving_summary_buffer))
+        if self.user_preferences:
+            preferences = orjson.dumps(self.user_preferences).decode()
+            context.append(SystemMessage(content=f"Preferencias conocidas del cliente: {preferences}"))
+        
+        buffer = self.chat_memory.messages
+        if self.return_messages:
+            return {self.memory_key: buffer, self.context_key: context}
+        
+        return {
+            self.memory_key: self._buffer_as_string(buffer),
+            self.context_key: "\n".join(message.content for message in context)
+        }
+    
+    def _buffer_as_string(self, messages: List[BaseMessage]) -> str:
+        """Render messages as "Prefix: content" lines.
+        
+        Same output as langchain's get_buffer_string, but the prefix is
+        looked up by exact message class instead of walking a chain of
+        isinstance checks for every message. Other message types (and AI
+        messages carrying a function call) fall back to get_buffer_string.
+        
+        Args:
+            messages: Messages to render
             
-        except Exception as e:
-            logger.error(f"Error summarizing messages: {str(e)}")
-            # Fall back to truncation if summarization fails
-            self.chat_memory.messages = recent_messages
+        Returns:
+            The messages joined by newlines
+        """
+        prefixes = {HumanMessage: self.human_prefix, AIMessage: self.ai_prefix, SystemMessage: "System"}
+        lines = []
+        for message in messages:
+            prefix = prefixes.get(type(message))
+            if prefix is None or "function_call" in message.additional_kwargs:
+                lines.append(get_buffer_string([message], human_prefix=self.human_prefix, ai_prefix=self.ai_prefix))
+            else:
+                lines.append(f"{prefix}: {message.content}")
+        return "\n".join(lines)
+    
+    def _truncate_summary(self) -> None:
+        """Keep the running summary within half of max_token_limit.
+        
+        The moving summary is rewritten on every prune and can itself grow
+        without bound, so it is cut down to its most recent part once it
+        takes more than half of the budget.
+        """
+        if not self.moving_summary_buffer:
+            return
+        
+        summary_limit = self.max_token_limit // 2
+        summary_tokens = self.llm.get_num_tokens(self.moving_summary_buffer)
+        if summary_tokens > summary_limit:
+            keep_chars = len(self.moving_summary_buffer) * summary_limit // summary_tokens
+            self.moving_summary_buffer = self.moving_summary_buffer[-keep_chars:]
+            logger.info(f"Truncated conversation summary from {summary_tokens} tokens")
+    
+    def _pop_pruned_messages(self) -> List[BaseMessage]:
+        """Remove the oldest messages until the buffer fits max_token_limit.
+        
+        Returns:
+            The removed messages, oldest first
+        """
+        buffer = self.chat_memory.messages
+        pruned_memory = []
+        curr_buffer_length = self.llm.get_num_tokens_from_messages(buffer)
+        if curr_buffer_length <= self.max_token_limit:
+            return pruned_memory
+        
+        # Message token counts add up (plus a fixed overhead), so subtract
+        # each removed message instead of re-tokenizing the whole buffer
+        base_length = self.llm.get_num_tokens_from_messages([])
+        while buffer and curr_buffer_length > self.max_token_limit:
+            message = buffer.pop(0)
+            pruned_memory.append(message)
+            curr_buffer_length -= self.llm.get_num_tokens_from_messages([message]) - base_length
+        return pruned_memory
+    
+    def prune(self) -> None:
+        """Prune the buffer and keep the running summary within budget."""
+        pruned_memory = self._pop_pruned_messages()
+        if pruned_memory:
+            chain = LLMChain(llm=self.llm, prompt=self.prompt)
+            self.moving_summary_buffer = chain.predict(
+                summary=self.moving_summary_buffer, new_lines=self._buffer_as_string(pruned_memory)
+            )
+        self._truncate_summary()
+    
+    async def aprune(self) -> None:
+        """Async version of prune.
+        
+        The summary is requested through the LLM's async client, so
+        summaries for many concurrent sessions share one connection pool
+        on the event loop instead of each blocking a worker thread.
+        """
+        pruned_memory = self._pop_pruned_messages()
+        if pruned_memory:
+            chain = LLMChain(llm=self.llm, prompt=self.prompt)
+            self.moving_summary_buffer = await chain.apredict(
+                summary=self.moving_summary_buffer, new_lines=self._buffer_as_string(pruned_memory)
+            )
+        self._truncate_summary()
     
     def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
         """Save the input/output pairs to the chat message history.
         
-        Override to add summarization and metrics tracking.
+        Override to add metrics tracking; the parent method takes care
+        of pruning and summarizing older messages.
         
         Args:
             inputs: Dictionary of inputs
             outputs: Dictionary of outputs
         """
-        # Call the parent method to save the context
+        # Call the parent method to save the context (and prune if needed)
         super().save_context(inputs, outputs)
         
         # Update engagement metrics
-        self.engagement_metrics["message_count"] += 1
+        self._engagement[EngagementMetric.MESSAGE_COUNT] += 1
+    
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Async version of save_context, used when the agent runs via ainvoke.
         
-        # Check if we need to summarize
-        if (self.engagement_metrics["message_count"] % SUMMARY_INTERVAL == 0 and 
-            self.llm is not None):
-            self._summarize_older_messages()
+        Args:
+            inputs: Dictionary of inputs
+            outputs: Dictionary of outputs
+        """
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        await self.chat_memory.aadd_messages(
+            [HumanMessage(content=input_str), AIMessage(content=output_str)]
+        )
+        await self.aprune()
+        
+        # Update engagement metrics
+        self._engagement[EngagementMetric.MESSAGE_COUNT] += 1
     
     def clear(self) -> None:
         """Clear memory contents."""
         super().clear()
         self.user_preferences = {}
         self.property_history = []
-        self.engagement_metrics = {
-            "message_count": 0,
-            "search_count": 0,
-            "property_clicks": 0,
-            "interest_indicators": 0
-        }
\ No newline at end of file
+        self._history_ids = set()
+        self._engagement = _new_engagement_counters()
\ No newline at end of file
@@ -1,11 +1,12 @@
 from langchain.tools import tool
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-import json
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+import functools
+import heapq
 import re
 import os
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import orjson
 from loguru import logger
 
 from .templates import format_property_list
@@ -33,6 +34,52 @@ class PropertySearchOutput(BaseModel):
         description="Total number of matching properties"
     )
 
+# Folds accented vowels to plain ones, so "habitación" and "habitacion"
+# or "Usaquén" and "usaquen" compare equal (ñ is a separate letter and kept)
+_ACCENT_TABLE = str.maketrans('áéíóúüÁÉÍÓÚÜ', 'aeiouuAEIOUU')
+
+def _fold(text: str) -> str:
+    """Lowercase text and strip accents from its vowels."""
+    return text.lower().translate(_ACCENT_TABLE)
+
+# Patterns used by extract_filters (on accent-folded text), compiled once at import
+_PRICE_RE = re.compile(r'(\d+[\d.,]*)\s*(?:millones|millon|m)(?:\s*de pesos)?', re.IGNORECASE)
+_PRICE_RANGE_RE = re.compile(r'entre\s*(\d+[\d.,]*)\s*y\s*(\d+[\d.,]*)\s*(?:millones|millon|m)', re.IGNORECASE)
+_BEDROOMS_RE = re.compile(r'(\d+)\s*(?:habitaciones|hab|habitacion|cuartos|recamaras)', re.IGNORECASE)
+_BATHROOMS_RE = re.compile(r'(\d+)\s*(?:baños|baño)', re.IGNORECASE)
+_AREA_RE = re.compile(r'(\d+)\s*(?:m2|metros cuadrados|metros|m²)', re.IGNORECASE)
+_APARTMENT_RE = re.compile(r'\b(?:apartamento|apto|apartamentos)\b', re.IGNORECASE)
+_HOUSE_RE = re.compile(r'\b(?:casa|casas)\b', re.IGNORECASE)
+
+# Common neighborhoods in Bogotá and Medellín
+_NEIGHBORHOODS = (
+    'chapinero', 'usaquen', 'chico', 'cedritos', 'salitre', 
+    'poblado', 'laureles', 'envigado', 'sabaneta', 'belen',
+    'estadio', 'itagui', 'caldas', 'estrella', 'robledo',
+    'santa barbara', 'rosales', 'teusaquillo', 'suba', 'bosa',
+    'kennedy', 'candelaria', 'fontibon'
+)
+
+# Common amenities
+_AMENITIES = (
+    'piscina', 'gimnasio', 'gym', 'parqueadero', 'parking', 
+    'terraza', 'balcon', 'jardin', 
+    'seguridad', 'vigilancia', 'ascensor', 'bbq', 'playground'
+)
+
+def _keyword_pattern(keywords):
+    """Compile keywords into one case-insensitive alternation.
+    
+    Longer keywords come first so the longest one wins where several
+    match at the same position, and a single findall finds every keyword
+    mentioned instead of testing each one against the query.
+    """
+    alternatives = sorted(keywords, key=len, reverse=True)
+    return re.compile('|'.join(map(re.escape, alternatives)), re.IGNORECASE)
+
+_NEIGHBORHOOD_RE = _keyword_pattern(_NEIGHBORHOODS)
+_AMENITY_RE = _keyword_pattern(_AMENITIES)
+
 def extract_filters(query: str) -> Dict[str, Any]:
     """Extract explicit filter criteria from a natural language query.
     
@@ -43,25 +90,39 @@ def extract_filters(query: str) -> Dict[str, Any]:
     - property type (apartment, house)
     - amenities
     
+    Results are cached by normalized query, since the same query is parsed
+    by the response cache and the search tool, and users repeat queries;
+    callers share the returned dictionary and must not modify it.
+    
     Args:
         query: Natural language query from user
         
     Returns:
         Dictionary of extracted filters
     """
-    filters = {}
+    # Normalize query - lowercase and remove accents for simpler matching
+    return _extract_folded_filters(_fold(query))
+
+@functools.lru_cache(maxsize=1024)
+def _extract_folded_filters(query: str) -> Dict[str, Any]:
+    """Extract filter criteria from a query already passed through _fold.
     
-    # Normalize query - lowercase and remove accents for simpler regex matching
-    normalized_query = query.lower()
+    Args:
+        query: Lowercased query without accents
+        
+    Returns:
+        Dictionary of extracted filters
+    """
+    filters = {}
     
     # Extract price information
-    price_match = re.search(r'(\d+[\d.,]*)\s*(?:millones|millon|m)(?:\s*de pesos)?', normalized_query)
+    price_match = _PRICE_RE.search(query)
     if price_match:
         price_str = price_match.group(1).replace('.', '').replace(',', '')
         # Convert to full number (e.g., 500 million = 500,000,000)
         filters['max_price'] = int(float(price_str) * 1_000_000)
     
-    price_range_match = re.search(r'entre\s*(\d+[\d.,]*)\s*y\s*(\d+[\d.,]*)\s*(?:millones|millon|m)', normalized_query)
+    price_range_match = _PRICE_RANGE_RE.search(query)
     if price_range_match:
         min_price_str = price_range_match.group(1).replace('.', '').replace(',', '')
         max_price_str = price_range_match.group(2).replace('.', '').replace(',', '')
@@ -69,240 +130,341 @@ def extract_filters(query: str) -> Dict[str, Any]:
         filters['max_price'] = int(float(max_price_str) * 1_000_000)
     
     # Extract bedrooms
-    bedrooms_match = re.search(r'(\d+)\s*(?:habitaciones|hab|habitación|cuartos|recámaras)', normalized_query)
+    bedrooms_match = _BEDROOMS_RE.search(query)
     if bedrooms_match:
         filters['min_bedrooms'] = int(bedrooms_match.group(1))
     
     # Extract bathrooms
-    bathrooms_match = re.search(r'(\d+)\s*(?:baños|baño)', normalized_query)
+    bathrooms_match = _BATHROOMS_RE.search(query)
     if bathrooms_match:
         filters['min_bathrooms'] = int(bathrooms_match.group(1))
     
     # Extract area (m²)
-    area_match = re.search(r'(\d+)\s*(?:m2|metros cuadrados|metros|m²)', normalized_query)
+    area_match = _AREA_RE.search(query)
     if area_match:
         filters['min_area'] = int(area_match.group(1))
     
     # Extract property type
-    if re.search(r'\b(?:apartamento|apto|apartamentos)\b', normalized_query):
+    if _APARTMENT_RE.search(query):
         filters['property_type'] = 'apartamento'
-    elif re.search(r'\b(?:casa|casas)\b', normalized_query):
+    elif _HOUSE_RE.search(query):
         filters['property_type'] = 'casa'
     
-    # Extract common neighborhoods in Bogotá and Medellín
-    neighborhoods = [
-        'chapinero', 'usaquen', 'chico', 'cedritos', 'salitre', 
-        'poblado', 'laureles', 'envigado', 'sabaneta', 'belen',
-        'estadio', 'itagui', 'caldas', 'estrella', 'robledo',
-        'santa barbara', 'rosales', 'teusaquillo', 'suba', 'bosa',
-        'kennedy', 'candelaria', 'fontibon'
-    ]
-    
-    found_neighborhoods = []
-    for neighborhood in neighborhoods:
-        if neighborhood in normalized_query:
-            found_neighborhoods.append(neighborhood)
-    
+    # Extract neighborhoods and amenities (each listed once, in the order
+    # they are mentioned)
+    found_neighborhoods = list(dict.fromkeys(_NEIGHBORHOOD_RE.findall(query)))
     if found_neighborhoods:
         filters['neighborhoods'] = found_neighborhoods
     
-    # Extract amenities
-    amenities = [
-        'piscina', 'gimnasio', 'gym', 'parqueadero', 'parking', 
-        'terraza', 'balcón', 'balcon', 'jardín', 'jardin', 
-        'seguridad', 'vigilancia', 'ascensor', 'bbq', 'playground'
-    ]
-    
-    found_amenities = []
-    for amenity in amenities:
-        if amenity in normalized_query:
-            found_amenities.append(amenity)
-    
+    found_amenities = list(dict.fromkeys(_AMENITY_RE.findall(query)))
     if found_amenities:
         filters['amenities'] = found_amenities
     
     logger.info(f"Extracted filters: {filters}")
     return filters
 
-def apply_filters(properties: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+def build_property_columns(properties: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Build column arrays of the property fields used by filters.
+    
+    Text fields are stored lowercased and without accents, so matching them
+    doesn't normalize every property again on each search.
+    
+    Args:
+        properties: List of property dictionaries
+        
+    Returns:
+        Dictionary of NumPy arrays (price, bedrooms, bathrooms, area,
+        amenity_count, and normalized title and neighborhood), each aligned
+        with the property list, plus 'amenity_names' with every normalized
+        amenity in the catalog and 'amenity_matrix', a boolean array with a
+        row per property and a column per amenity name
+    """
+    count = len(properties)
+    property_amenities = [frozenset(map(_fold, p.get('amenities', ()))) for p in properties]
+    amenity_names = sorted(frozenset().union(*property_amenities))
+    amenity_columns = {name: column for column, name in enumerate(amenity_names)}
+    amenity_matrix = np.zeros((count, len(amenity_names)), dtype=bool)
+    for row, names in enumerate(property_amenities):
+        amenity_matrix[row, [amenity_columns[name] for name in names]] = True
+    return {
+        'price': np.fromiter((p['price'] for p in properties), dtype=np.int64, count=count),
+        'bedrooms': np.fromiter((p['bedrooms'] for p in properties), dtype=np.int16, count=count),
+        'bathrooms': np.fromiter((p['bathrooms'] for p in properties), dtype=np.int16, count=count),
+        'area': np.fromiter((p['area'] for p in properties), dtype=np.float64, count=count),
+        'amenity_count': np.fromiter((len(p.get('amenities', ())) for p in properties), dtype=np.int16, count=count),
+        'title': np.array([_fold(p['title']) for p in properties], dtype=str),
+        'neighborhood': np.array([_fold(p['neighborhood']) for p in properties], dtype=str),
+        'amenity_names': np.array(amenity_names, dtype=str),
+        'amenity_matrix': amenity_matrix
+    }
+
+# Numeric filters and the column and comparison each one applies
+_NUMERIC_FILTERS = (
+    ('min_price', 'price', np.greater_equal),
+    ('max_price', 'price', np.less_equal),
+    ('min_bedrooms', 'bedrooms', np.greater_equal),
+    ('min_bathrooms', 'bathrooms', np.greater_equal),
+    ('min_area', 'area', np.greater_equal)
+)
+
+def apply_filters(properties: List[Dict[str, Any]], filters: Dict[str, Any],
+                  columns: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, Any]]:
     """Apply extracted filters to the property list.
     
+    Numeric, neighborhood, type and amenity filters are combined into one
+    boolean mask over column arrays, so only the properties that pass all
+    of them are visited in Python.
+    
     Args:
         properties: List of property dictionaries
         filters: Dictionary of filters to apply
+        columns: Column arrays from build_property_columns (built from the
+            properties if not given)
         
     Returns:
         Filtered list of properties
     """
-    filtered_properties = properties.copy()
-    
-    # Apply price filters
-    if 'min_price' in filters:
-        filtered_properties = [p for p in filtered_properties if p['price'] >= filters['min_price']]
-    if 'max_price' in filters:
-        filtered_properties = [p for p in filtered_properties if p['price'] <= filters['max_price']]
-    
-    # Apply bedroom filters
-    if 'min_bedrooms' in filters:
-        filtered_properties = [p for p in filtered_properties if p['bedrooms'] >= filters['min_bedrooms']]
-    
-    # Apply bathroom filters
-    if 'min_bathrooms' in filters:
-        filtered_properties = [p for p in filtered_properties if p['bathrooms'] >= filters['min_bathrooms']]
-    
-    # Apply area filters
-    if 'min_area' in filters:
-        filtered_properties = [p for p in filtered_properties if p['area'] >= filters['min_area']]
-    
-    # Apply neighborhood filters
-    if 'neighborhoods' in filters:
-        # Case-insensitive check for any of the specified neighborhoods
-        neighborhood_properties = []
-        for p in filtered_properties:
-            for neighborhood in filters['neighborhoods']:
-                if neighborhood.lower() in p['neighborhood'].lower():
-                    neighborhood_properties.append(p)
-                    break
-        filtered_properties = neighborhood_properties
+    if columns is None:
+        columns = build_property_columns(properties)
+    
+    # Apply price, bedroom, bathroom and area filters
+    mask = np.ones(len(properties), dtype=bool)
+    for filter_name, column, compare in _NUMERIC_FILTERS:
+        if filter_name in filters:
+            mask &= compare(columns[column], filters[filter_name])
+    
+    # Apply neighborhood filters (any of them, ignoring case and accents)
+    if filters.get('neighborhoods'):
+        in_neighborhoods = np.zeros(len(properties), dtype=bool)
+        for neighborhood in filters['neighborhoods']:
+            in_neighborhoods |= np.char.find(columns['neighborhood'], _fold(neighborhood)) >= 0
+        mask &= in_neighborhoods
     
     # Apply property type filter
     if 'property_type' in filters:
-        property_type = filters['property_type']
-        filtered_properties = [p for p in filtered_properties if property_type.lower() in p['title'].lower()]
+        mask &= np.char.find(columns['title'], _fold(filters['property_type'])) >= 0
     
     # Apply amenities filter if present in property data
     if 'amenities' in filters:
-        amenity_properties = []
-        for p in filtered_properties:
-            if 'amenities' in p:
-                # Check if any requested amenity is in the property's amenities
-                if any(amenity in [a.lower() for a in p['amenities']] for amenity in filters['amenities']):
-                    amenity_properties.append(p)
+        # Check if any requested amenity is in the property's amenities
+        requested = np.isin(columns['amenity_names'], [_fold(amenity) for amenity in filters['amenities']])
+        amenity_mask = mask & columns['amenity_matrix'][:, requested].any(axis=1)
         
         # Only filter if we found properties with matching amenities
-        if amenity_properties:
-            filtered_properties = amenity_properties
+        if amenity_mask.any():
+            mask = amenity_mask
+    
+    filtered_properties = [properties[i] for i in np.flatnonzero(mask)]
     
     logger.info(f"Filtering reduced properties from {len(properties)} to {len(filtered_properties)}")
     return filtered_properties
 
-def rank_properties(properties: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+# Common Spanish words left out of the text index (and so ignored in
+# queries), since they match almost every property
+_STOPWORDS = frozenset({
+    'de', 'del', 'la', 'el', 'en', 'con', 'un', 'una', 'y', 'o', 'para',
+    'por', 'a', 'al', 'los', 'las', 'que', 'se', 'su', 'sus', 'es', 'mi',
+    'me', 'lo', 'le', 'muy', 'busco', 'quiero', 'algo', 'tiene', 'tenga'
+})
+
+def build_text_index(properties: List[Dict[str, Any]]):
+    """Fit a TF-IDF index over the text of each property.
+    
+    Args:
+        properties: List of property dictionaries
+        
+    Returns:
+        Tuple of (fitted TfidfVectorizer, sparse matrix with one
+        L2-normalized row per property)
+    """
+    # Imported here so scikit-learn only loads once a search is made
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    
+    vectorizer = TfidfVectorizer(strip_accents='unicode', stop_words=sorted(_STOPWORDS), dtype=np.float32)
+    # The neighborhood is repeated so matching it weighs more than a
+    # mention in the description
+    texts = [f"{p['title']} {p['neighborhood']} {p['neighborhood']} {p['description']}" for p in properties]
+    return vectorizer, vectorizer.fit_transform(texts)
+
+class PropertyCatalog(NamedTuple):
+    """The property list with the indexes built over it at load time."""
+    
+    properties: List[Dict[str, Any]]
+    columns: Dict[str, np.ndarray]
+    by_id: Dict[str, Dict[str, Any]]
+    rows: Dict[str, int]
+    vectorizer: Any
+    text_matrix: Any
+
+def rank_properties(properties: List[Dict[str, Any]], query: str,
+                    catalog: Optional[PropertyCatalog] = None,
+                    limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """Rank properties based on relevance to query.
     
-    In a real implementation, this would use embeddings for semantic similarity.
-    For now, we'll use a simple keyword matching approach.
+    Properties are scored by the cosine similarity between the query and
+    their TF-IDF vectors (title, neighborhood and description), all in a
+    single sparse product, plus a small boost for properties with more
+    amenities.
     
     Args:
         properties: List of property dictionaries
         query: User's search query
+        catalog: Catalog the properties come from, whose prebuilt index is
+            used (an index is fitted on the properties if not given)
+        limit: Maximum number of properties to return (all if not given)
         
     Returns:
         Ranked list of properties
     """
     # If we have fewer than 2 properties, no need to rank
     if len(properties) < 2:
-        return properties
+        return properties[:limit]
+    
+    if catalog is not None:
+        rows = [catalog.rows[p['id']] for p in properties]
+        vectorizer = catalog.vectorizer
+        text_matrix = catalog.text_matrix[rows]
+        amenity_counts = catalog.columns['amenity_count'][rows]
+    else:
+        vectorizer, text_matrix = build_text_index(properties)
+        amenity_counts = build_property_columns(properties)['amenity_count']
+    
+    # Rows and query are L2-normalized, so the dot product is the cosine similarity
+    scores = (text_matrix @ vectorizer.transform([query]).T).toarray().ravel()
+    
+    # Boost scores for properties with more amenities (capped)
+    scores += np.minimum(amenity_counts * 0.1, 0.5)
+    
+    # Sort by score (descending), keeping the original order on ties; when
+    # only the top few are wanted, select them without sorting the rest
+    if limit is not None and limit < len(properties):
+        order = heapq.nlargest(limit, range(len(properties)), key=scores.tolist().__getitem__)
+    else:
+        order = np.argsort(-scores, kind='stable')
+    return [properties[i] for i in order]
+
+# Minimal sample data used when the catalog file is missing
+_FALLBACK_PROPERTIES = [
+    {
+        "id": "prop1",
+        "title": "Apartamento en Chapinero",
+        "price": 450000000,
+        "bedrooms": 2,
+        "bathrooms": 2,
+        "area": 75,
+        "neighborhood": "Chapinero",
+        "description": "Hermoso apartamento en Chapinero con vista a la ciudad",
+        "url": "https://lahaus.com/properties/prop1",
+        "amenities": ["Gimnasio", "Piscina", "Seguridad 24h"]
+    },
+    {
+        "id": "prop2",
+        "title": "Casa en Usaquén",
+        "price": 950000000,
+        "bedrooms": 3,
+        "bathrooms": 3,
+        "area": 150,
+        "neighborhood": "Usaquén",
+        "description": "Amplia casa con jardín en zona exclusiva de Usaquén",
+        "url": "https://lahaus.com/properties/prop2",
+        "amenities": ["Jardín", "Parqueadero", "Seguridad 24h"]
+    }
+]
+
+# Path of the property catalog (the fallback data is used if it is missing)
+_CATALOG_PATH = os.path.join('data', 'sample_properties.json')
+
+def get_catalog_version() -> Optional[Tuple[int, int]]:
+    """Get the version of the property catalog file.
+    
+    Returns:
+        Modification time and size of the catalog file, or None if it
+        doesn't exist (the fallback data is used)
+    """
+    try:
+        stat = os.stat(_CATALOG_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _load_properties() -> PropertyCatalog:
+    """Get the property catalog and its indexes.
+    
+    The catalog is read, parsed and indexed once, and again only after the
+    file changes; searches and ID lookups share the cached result, so they
+    must not modify it.
     
-    # Simple ranking using keyword occurrence
-    query_words = set(query.lower().split())
+    Returns:
+        PropertyCatalog with the property list, its numeric column arrays,
+        the properties and their row numbers by ID, and the text index
+    """
+    return _read_catalog(get_catalog_version())
+
+@functools.lru_cache(maxsize=1)
+def _read_catalog(version: Optional[Tuple[int, int]]) -> PropertyCatalog:
+    """Read the property catalog and build its indexes.
     
-    # Calculate a relevance score for each property
-    for prop in properties:
-        # Combine all textual fields for matching
-        property_text = f"{prop['title']} {prop['neighborhood']} {prop['description']}".lower()
+    Args:
+        version: Modification time and size of the catalog file, or None
+            to use the fallback data
         
-        # Count matching words
-        matching_words = sum(1 for word in query_words if word in property_text)
+    Returns:
+        PropertyCatalog built from the file (or the fallback data)
+    """
+    if version is not None:
+        with open(_CATALOG_PATH, 'rb') as f:
+            properties = orjson.loads(f.read())
+    else:
+        # Fallback to minimal sample data
+        properties = _FALLBACK_PROPERTIES
+    
+    vectorizer, text_matrix = build_text_index(properties)
+    return PropertyCatalog(
+        properties=properties,
+        columns=build_property_columns(properties),
+        by_id={prop['id']: prop for prop in properties},
+        rows={prop['id']: row for row, prop in enumerate(properties)},
+        vectorizer=vectorizer,
+        text_matrix=text_matrix
+    )
+
+# The search tool holds no state, so it is built once at import and shared
+@tool
+def search_properties(query: str, max_results: int = 5) -> str:
+    """Search for properties that match the given criteria.
+    
+    Args:
+        query: A natural language description of what the user is looking for in a property,
+               such as 'apartments in Chapinero with 2 bedrooms under 500 million pesos'
+        max_results: Maximum number of results to return
+        
+    Returns:
+        A string with information about matching properties
+    """
+    try:
+        # 1. Load property data
+        catalog = _load_properties()
         
-        # Calculate a basic score
-        prop['_score'] = matching_words / len(query_words) if query_words else 0
+        # 2. Extract filters from the query
+        filters = extract_filters(query)
         
-        # Boost scores for exact neighborhood matches
-        for word in query_words:
-            if word in prop['neighborhood'].lower():
-                prop['_score'] += 0.5
+        # 3. Apply filters to narrow down properties
+        filtered_properties = apply_filters(catalog.properties, filters, catalog.columns)
         
-        # Boost scores for properties with more amenities
-        if 'amenities' in prop:
-            prop['_score'] += min(len(prop['amenities']) * 0.1, 0.5)  # Cap the boost
-    
-    # Sort by score (descending)
-    ranked_properties = sorted(properties, key=lambda p: p.get('_score', 0), reverse=True)
-    
-    return ranked_properties
+        # 4. Rank the results by relevance, keeping the best max_results
+        results = rank_properties(filtered_properties, query, catalog, limit=max_results)
+        
+        # 5. Format the results using the template
+        formatted_response = format_property_list(results, max_results)
+        
+        return formatted_response
+        
+    except Exception as e:
+        logger.error(f"Error in property search: {str(e)}")
+        return "Lo siento, hubo un problema al buscar propiedades. Por favor intenta de nuevo."
 
 def create_property_search_tool():
     """Create a LangChain tool for searching properties with filter extraction and ranking."""
-    
-    @tool
-    def search_properties(query: str, max_results: int = 5) -> str:
-        """Search for properties that match the given criteria.
-        
-        Args:
-            query: A natural language description of what the user is looking for in a property,
-                   such as 'apartments in Chapinero with 2 bedrooms under 500 million pesos'
-            max_results: Maximum number of results to return
-            
-        Returns:
-            A string with information about matching properties
-        """
-        try:
-            # 1. Load property data
-            sample_data_path = os.path.join('data', 'sample_properties.json')
-            
-            if os.path.exists(sample_data_path):
-                with open(sample_data_path, 'r', encoding='utf-8') as f:
-                    properties = json.load(f)
-            else:
-                # Fallback to minimal sample data
-                properties = [
-                    {
-                        "id": "prop1",
-                        "title": "Apartamento en Chapinero",
-                        "price": 450000000,
-                        "bedrooms": 2,
-                        "bathrooms": 2,
-                        "area": 75,
-                        "neighborhood": "Chapinero",
-                        "description": "Hermoso apartamento en Chapinero con vista a la ciudad",
-                        "url": "https://lahaus.com/properties/prop1",
-                        "amenities": ["Gimnasio", "Piscina", "Seguridad 24h"]
-                    },
-                    {
-                        "id": "prop2",
-                        "title": "Casa en Usaquén",
-                        "price": 950000000,
-                        "bedrooms": 3,
-                        "bathrooms": 3,
-                        "area": 150,
-                        "neighborhood": "Usaquén",
-                        "description": "Amplia casa con jardín en zona exclusiva de Usaquén",
-                        "url": "https://lahaus.com/properties/prop2",
-                        "amenities": ["Jardín", "Parqueadero", "Seguridad 24h"]
-                    }
-                ]
-            
-            # 2. Extract filters from the query
-            filters = extract_filters(query)
-            
-            # 3. Apply filters to narrow down properties
-            filtered_properties = apply_filters(properties, filters)
-            
-            # 4. Rank the results by relevance
-            ranked_properties = rank_properties(filtered_properties, query)
-            
-            # 5. Limit the number of results
-            results = ranked_properties[:min(max_results, len(ranked_properties))]
-            
-            # 6. Format the results using the template
-            formatted_response = format_property_list(results, max_results)
-            
-            return formatted_response
-            
-        except Exception as e:
-            logger.error(f"Error in property search: {str(e)}")
-            return "Lo siento, hubo un problema al buscar propiedades. Por favor intenta de nuevo."
-    
     return search_properties
 
 # Function to get property by ID (useful for follow-up questions)
@@ -316,17 +478,7 @@ def get_property_by_id(property_id: str) -> Dict[str, Any]:
         Property dictionary if found, otherwise None
     """
     try:
-        sample_data_path = os.path.join('data', 'sample_properties.json')
-        
-        if os.path.exists(sample_data_path):
-            with open(sample_data_path, 'r', encoding='utf-8') as f:
-                properties = json.load(f)
-                
-                for prop in properties:
-                    if prop['id'] == property_id:
-                        return prop
-        
-        return None
+        return _load_properties().by_id.get(property_id)
     
     except Exception as e:
         logger.error(f"Error retrieving property by ID: {str(e)}")
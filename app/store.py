@@ -0,0 +1,345 @@
+from typing import Deque, Dict, List, Any, Iterable, NamedTuple, Optional
+from collections import deque
+from itertools import islice
+from cachetools import TTLCache
+import orjson
+import time
+from loguru import logger
+
+from .config import REDIS_URL, MAX_CONVERSATION_HISTORY, MAX_CONVERSATIONS, CONVERSATION_TTL
+
+class ConversationMessage(NamedTuple):
+    """A message in a user's conversation history.
+
+    A named tuple rather than a dict: it takes a fraction of the memory,
+    which matters with many users each keeping a full history in process.
+    """
+
+    role: str
+    content: str
+    timestamp: float
+    id: str
+    processing_time: Optional[float] = None
+
+class InMemoryConversationStore:
+    """Conversation history, preferences and metrics kept in this process.
+
+    This is the default store. It is fast but lost on restart and not
+    shared between workers, so it only suits single-process deployments.
+    Conversations idle for longer than the TTL are dropped, and the least
+    recently active ones are evicted once max_conversations is reached.
+    """
+
+    def __init__(self, max_messages: int = MAX_CONVERSATION_HISTORY * 2,
+                 max_conversations: int = MAX_CONVERSATIONS, ttl: int = CONVERSATION_TTL):
+        self.max_messages = max_messages
+        self._histories: Dict[str, Deque[ConversationMessage]] = TTLCache(maxsize=max_conversations, ttl=ttl)
+        self._preferences: Dict[str, Dict[str, Any]] = TTLCache(maxsize=max_conversations, ttl=ttl)
+        self._metrics: Dict[str, Dict[str, Any]] = TTLCache(maxsize=max_conversations, ttl=ttl)
+        self._total_messages = 0
+
+    async def append_message(self, sender: str, message: ConversationMessage) -> None:
+        """Append a message to a user's history, keeping the latest ones.
+
+        Args:
+            sender: User identifier
+            message: Message to store
+        """
+        # Bounded deque, so the oldest message drops out in O(1)
+        history = self._histories.get(sender)
+        if history is None:
+            history = deque(maxlen=self.max_messages)
+        history.append(message)
+        # Assign again so the conversation's TTL restarts
+        self._histories[sender] = history
+
+    async def record_turn(self, sender: str, user_message: ConversationMessage,
+                          assistant_message: ConversationMessage, preferences: Dict[str, Any]) -> None:
+        """Store a completed turn and the user's preferences in one update.
+
+        Args:
+            sender: User identifier
+            user_message: Message the user sent
+            assistant_message: Reply sent to the user
+            preferences: Preferences extracted for the user so far
+        """
+        history = self._histories.get(sender)
+        if history is None:
+            history = deque(maxlen=self.max_messages)
+        history.extend((user_message, assistant_message))
+        self._histories[sender] = history
+        self._preferences[sender] = dict(preferences)
+
+    async def get_history(self, sender: str) -> List[ConversationMessage]:
+        """Get a user's conversation history (oldest message first).
+
+        Args:
+            sender: User identifier
+
+        Returns:
+            List of messages
+        """
+        return list(self._histories.get(sender, ()))
+
+    async def has_conversation(self, sender: str) -> bool:
+        """Check whether a user has a stored conversation."""
+        return sender in self._histories
+
+    async def conversation_lengths(self, senders: Iterable[str]) -> List[int]:
+        """Get the number of stored messages for several users at once."""
+        return [len(self._histories.get(sender, ())) for sender in senders]
+
+    async def count_conversations(self) -> int:
+        """Get the number of users with a stored conversation."""
+        return len(self._histories)
+
+    async def clear(self, sender: str) -> None:
+        """Delete a user's conversation history and preferences."""
+        self._histories.pop(sender, None)
+        self._preferences.pop(sender, None)
+
+    async def save_preferences(self, sender: str, preferences: Dict[str, Any]) -> None:
+        """Store the preferences extracted for a user."""
+        self._preferences[sender] = dict(preferences)
+
+    async def get_preferences(self, sender: str) -> Dict[str, Any]:
+        """Get the stored preferences for a user."""
+        return dict(self._preferences.get(sender, {}))
+
+    async def record_incoming_message(self, sender: str, timestamp: float) -> None:
+        """Count a message received from a user and update their activity.
+
+        Args:
+            sender: User identifier
+            timestamp: Time the message was received
+        """
+        metrics = self._metrics.get(sender) or {"total_messages": 0, "session_start": timestamp}
+        metrics["total_messages"] += 1
+        metrics["last_activity"] = timestamp
+        self._metrics[sender] = metrics
+        self._total_messages += 1
+
+    async def get_metrics(self, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Get the metrics (total_messages, session_start, last_activity) of active users.
+
+        Args:
+            offset: Number of users to skip
+            limit: Maximum number of users to return (all if None)
+
+        Returns:
+            Dictionary of metrics per user
+        """
+        stop = None if limit is None else offset + limit
+        return {sender: dict(metrics) for sender, metrics in islice(self._metrics.items(), offset, stop)}
+
+    async def count_users(self) -> int:
+        """Get the number of users with metrics."""
+        return len(self._metrics)
+
+    async def total_messages(self) -> int:
+        """Get the number of messages received since the store was created."""
+        return self._total_messages
+
+class RedisConversationStore:
+    """Conversation history, preferences and metrics kept in Redis.
+
+    Shared by every worker and kept across restarts, so the app can be
+    scaled horizontally. Each user's history is a Redis list
+    (hist:<sender>), preferences are a hash (prefs:<sender>) with JSON
+    values, metrics are a hash (met:<sender>) updated server-side, and
+    active users are kept in a sorted set scored by their last activity.
+    Every per-user key expires after the TTL of inactivity.
+    """
+
+    CONVERSATIONS_KEY = "active_conversations"
+    TOTAL_MESSAGES_KEY = "total_messages"
+
+    def __init__(self, redis, max_messages: int = MAX_CONVERSATION_HISTORY * 2,
+                 ttl: int = CONVERSATION_TTL):
+        self.redis = redis
+        self.max_messages = max_messages
+        self.ttl = ttl
+
+    @staticmethod
+    def _history_key(sender: str) -> str:
+        return f"hist:{sender}"
+
+    @staticmethod
+    def _preferences_key(sender: str) -> str:
+        return f"prefs:{sender}"
+
+    @staticmethod
+    def _metrics_key(sender: str) -> str:
+        return f"met:{sender}"
+
+    async def append_message(self, sender: str, message: ConversationMessage) -> None:
+        """Append a message to a user's history, keeping the latest ones.
+
+        The append, trim, expiry and active-user update go in one
+        round-trip.
+
+        Args:
+            sender: User identifier
+            message: Message to store
+        """
+        key = self._history_key(sender)
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, orjson.dumps(message._asdict()))
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._preferences_key(sender), self.ttl)
+            pipe.zadd(self.CONVERSATIONS_KEY, {sender: now})
+            pipe.zremrangebyscore(self.CONVERSATIONS_KEY, "-inf", now - self.ttl)
+            await pipe.execute()
+
+    async def record_turn(self, sender: str, user_message: ConversationMessage,
+                          assistant_message: ConversationMessage, preferences: Dict[str, Any]) -> None:
+        """Store a completed turn and the user's preferences in one update.
+
+        Both messages and the preferences go in a single round-trip.
+
+        Args:
+            sender: User identifier
+            user_message: Message the user sent
+            assistant_message: Reply sent to the user
+            preferences: Preferences extracted for the user so far
+        """
+        key = self._history_key(sender)
+        preferences_key = self._preferences_key(sender)
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, orjson.dumps(user_message._asdict()), orjson.dumps(assistant_message._asdict()))
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl)
+            if preferences:
+                pipe.hset(preferences_key, mapping={k: orjson.dumps(v) for k, v in preferences.items()})
+            pipe.expire(preferences_key, self.ttl)
+            pipe.zadd(self.CONVERSATIONS_KEY, {sender: now})
+            pipe.zremrangebyscore(self.CONVERSATIONS_KEY, "-inf", now - self.ttl)
+            await pipe.execute()
+
+    async def get_history(self, sender: str) -> List[ConversationMessage]:
+        """Get a user's conversation history (oldest message first).
+
+        Args:
+            sender: User identifier
+
+        Returns:
+            List of messages
+        """
+        messages = await self.redis.lrange(self._history_key(sender), 0, -1)
+        return [ConversationMessage(**orjson.loads(message)) for message in messages]
+
+    async def has_conversation(self, sender: str) -> bool:
+        """Check whether a user has a stored conversation."""
+        last_activity = await self.redis.zscore(self.CONVERSATIONS_KEY, sender)
+        return last_activity is not None and last_activity >= time.time() - self.ttl
+
+    async def conversation_lengths(self, senders: Iterable[str]) -> List[int]:
+        """Get the number of stored messages for several users at once."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for sender in senders:
+                pipe.llen(self._history_key(sender))
+            return await pipe.execute()
+
+    async def count_conversations(self) -> int:
+        """Get the number of users with a stored conversation."""
+        return await self.redis.zcount(self.CONVERSATIONS_KEY, time.time() - self.ttl, "+inf")
+
+    async def clear(self, sender: str) -> None:
+        """Delete a user's conversation history and preferences."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(self._history_key(sender), self._preferences_key(sender))
+            pipe.zrem(self.CONVERSATIONS_KEY, sender)
+            await pipe.execute()
+
+    async def save_preferences(self, sender: str, preferences: Dict[str, Any]) -> None:
+        """Store the preferences extracted for a user."""
+        if preferences:
+            key = self._preferences_key(sender)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={k: orjson.dumps(v) for k, v in preferences.items()})
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+
+    async def get_preferences(self, sender: str) -> Dict[str, Any]:
+        """Get the stored preferences for a user."""
+        stored = await self.redis.hgetall(self._preferences_key(sender))
+        return {k: orjson.loads(v) for k, v in stored.items()}
+
+    async def record_incoming_message(self, sender: str, timestamp: float) -> None:
+        """Count a message received from a user and update their activity.
+
+        Every update is done server-side in a single round-trip.
+
+        Args:
+            sender: User identifier
+            timestamp: Time the message was received
+        """
+        key = self._metrics_key(sender)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(key, "total_messages", 1)
+            pipe.hsetnx(key, "session_start", timestamp)
+            pipe.hset(key, "last_activity", timestamp)
+            pipe.expire(key, self.ttl)
+            pipe.zadd(self.CONVERSATIONS_KEY, {sender: timestamp})
+            pipe.incr(self.TOTAL_MESSAGES_KEY)
+            await pipe.execute()
+
+    async def get_metrics(self, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Get the metrics (total_messages, session_start, last_activity) of active users.
+
+        Users are returned most recently active first.
+
+        Args:
+            offset: Number of users to skip
+            limit: Maximum number of users to return (all if None)
+
+        Returns:
+            Dictionary of metrics per user
+        """
+        senders = await self.redis.zrevrangebyscore(
+            self.CONVERSATIONS_KEY, "+inf", time.time() - self.ttl,
+            start=offset, num=-1 if limit is None else limit
+        )
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for sender in senders:
+                pipe.hgetall(self._metrics_key(sender))
+            stored = await pipe.execute()
+
+        return {
+            sender: {
+                "total_messages": int(metrics["total_messages"]),
+                "session_start": float(metrics["session_start"]),
+                "last_activity": float(metrics["last_activity"])
+            }
+            for sender, metrics in zip(senders, stored) if metrics
+        }
+
+    async def count_users(self) -> int:
+        """Get the number of users with metrics."""
+        return await self.count_conversations()
+
+    async def total_messages(self) -> int:
+        """Get the number of messages received by every worker."""
+        return int(await self.redis.get(self.TOTAL_MESSAGES_KEY) or 0)
+
+def create_conversation_store(redis_url: Optional[str] = REDIS_URL):
+    """Create the conversation store for the app.
+
+    Args:
+        redis_url: Redis connection URL; the in-memory store is used if empty
+
+    Returns:
+        A RedisConversationStore if a Redis URL is configured, otherwise an
+        InMemoryConversationStore
+    """
+    if not redis_url:
+        return InMemoryConversationStore()
+
+    # Only needed when Redis is configured
+    from redis.asyncio import Redis
+
+    logger.info("Using Redis conversation store")
+    return RedisConversationStore(Redis.from_url(redis_url, decode_responses=True))
@@ -1,19 +1,74 @@
 from typing import List, Dict, Any, Optional
+import functools
 import re
 from datetime import datetime
 
 # ===== Formatting Utilities =====
 
+# Swaps the thousands separator Python uses for the Colombian one
+_COMMA_TO_DOT = str.maketrans(',', '.')
+
+@functools.lru_cache(maxsize=4096)
 def format_price(price: int) -> str:
     """Format a price with periods as thousand separators and currency symbol.
     
+    Catalog prices repeat across searches, so results are cached.
+    
     Args:
         price: Price value in Colombian pesos
         
     Returns:
         Formatted price string
     """
-    return f"${price:,}".replace(',', '.')
+    return f"${price:,}".translate(_COMMA_TO_DOT)
+
+# Icons for common amenities
+_AMENITY_ICONS = {
+    "piscina": "🏊",
+    "gimnasio": "🏋️",
+    "gym": "🏋️",
+    "parqueadero": "🚗",
+    "parking": "🚗",
+    "terraza": "🌇",
+    "balcón": "🏙️",
+    "balcon": "🏙️",
+    "jardín": "🌳",
+    "jardin": "🌳",
+    "seguridad": "🔒",
+    "vigilancia": "👮",
+    "ascensor": "🛗",
+    "bbq": "🍖",
+    "playground": "🎯",
+    "patio": "🏡",
+    "cocina": "🍳",
+    "lavanderia": "🧺",
+    "amoblado": "🪑",
+    "internet": "📶",
+    "aire": "❄️",
+    "calefaccion": "🔥",
+    "mascotas": "🐾",
+    "sala": "🛋️",
+    "comedor": "🍽️"
+}
+
+# Finds the first amenity keyword mentioned in an amenity name
+_AMENITY_ICON_RE = re.compile('|'.join(map(re.escape, _AMENITY_ICONS)), re.IGNORECASE)
+
+@functools.lru_cache(maxsize=1024)
+def _amenity_icon(amenity: str) -> str:
+    """Find the icon for an amenity, defaulting to a bullet point.
+    
+    The same amenity names appear across the whole catalog, so results
+    are cached.
+    
+    Args:
+        amenity: Amenity name
+        
+    Returns:
+        Icon for the first amenity keyword in the name
+    """
+    match = _AMENITY_ICON_RE.search(amenity)
+    return _AMENITY_ICONS[match.group(0).lower()] if match else "•"
 
 def format_amenities(amenities: List[str], max_display: int = 3, style: str = "list") -> str:
     """Format amenities for display with icons.
@@ -29,45 +84,7 @@ def format_amenities(amenities: List[str], max_display: int = 3, style: str = "l
     if not amenities:
         return ""
     
-    # Use appropriate icons for common amenities
-    amenity_icons = {
-        "piscina": "🏊",
-        "gimnasio": "🏋️",
-        "gym": "🏋️",
-        "parqueadero": "🚗",
-        "parking": "🚗",
-        "terraza": "🌇",
-        "balcón": "🏙️",
-        "balcon": "🏙️",
-        "jardín": "🌳",
-        "jardin": "🌳",
-        "seguridad": "🔒",
-        "vigilancia": "👮",
-        "ascensor": "🛗",
-        "bbq": "🍖",
-        "playground": "🎯",
-        "patio": "🏡",
-        "cocina": "🍳",
-        "lavanderia": "🧺",
-        "amoblado": "🪑",
-        "internet": "📶",
-        "aire": "❄️",
-        "calefaccion": "🔥",
-        "mascotas": "🐾",
-        "sala": "🛋️",
-        "comedor": "🍽️"
-    }
-    
-    formatted_amenities = []
-    for amenity in amenities[:max_display]:
-        # Look for a matching icon, defaulting to bullet point
-        icon = "•"
-        for key, value in amenity_icons.items():
-            if key.lower() in amenity.lower():
-                icon = value
-                break
-        
-        formatted_amenities.append(f"{icon} {amenity}")
+    formatted_amenities = [f"{_amenity_icon(amenity)} {amenity}" for amenity in amenities[:max_display]]
     
     # Indicate if there are more amenities
     if len(amenities) > max_display:
@@ -83,6 +100,29 @@ def format_amenities(amenities: List[str], max_display: int = 3, style: str = "l
     else:  # inline
         return ", ".join(formatted_amenities)
 
+# Spanish month names, in calendar order
+_MONTHS_ES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_iso_date(date_str: str) -> datetime:
+    """Parse an ISO date string, accepting a trailing 'Z' for UTC.
+    
+    The same listing dates are shown on many cards, so results are cached
+    (invalid dates raise and are not cached).
+    
+    Args:
+        date_str: Date string (ISO format)
+        
+    Returns:
+        Parsed datetime
+    """
+    if date_str.endswith('Z'):
+        date_str = date_str[:-1] + '+00:00'
+    return datetime.fromisoformat(date_str)
+
 def format_date(date_str: str, include_time: bool = False) -> str:
     """Format a date string into a user-friendly format.
     
@@ -94,23 +134,24 @@ def format_date(date_str: str, include_time: bool = False) -> str:
         Formatted date string
     """
     try:
-        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        months = [
-            "enero", "febrero", "marzo", "abril", "mayo", "junio", 
-            "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
-        ]
+        date_obj = _parse_iso_date(date_str)
+        month = _MONTHS_ES[date_obj.month - 1]
         
         if include_time:
-            return f"{date_obj.day} de {months[date_obj.month-1]} de {date_obj.year}, {date_obj.hour}:{date_obj.minute:02d}"
+            return f"{date_obj.day} de {month} de {date_obj.year}, {date_obj.hour}:{date_obj.minute:02d}"
         else:
-            return f"{date_obj.day} de {months[date_obj.month-1]} de {date_obj.year}"
+            return f"{date_obj.day} de {month} de {date_obj.year}"
     except (ValueError, TypeError):
         # Return original if invalid date
         return date_str
 
+@functools.lru_cache(maxsize=4096)
 def truncate_text(text: str, max_length: int = 100, add_ellipsis: bool = True) -> str:
     """Truncate text to a maximum length.
     
+    Property descriptions are truncated every time a property is shown,
+    so results are cached.
+    
     Args:
         text: Text to truncate
         max_length: Maximum length of the text
@@ -122,21 +163,23 @@ def truncate_text(text: str, max_length: int = 100, add_ellipsis: bool = True) -
     if not text or len(text) <= max_length:
         return text
     
-    # Try to truncate at a word boundary
-    truncated = text[:max_length]
-    last_space = truncated.rfind(' ')
-    
-    if last_space > max_length * 0.8:  # Only truncate at word if it's not too short
-        truncated = truncated[:last_space]
+    # Try to truncate at a word boundary, searching only the last 20% so
+    # the text isn't cut too short
+    last_space = text.rfind(' ', int(max_length * 0.8) + 1, max_length)
+    truncated = text[:last_space if last_space != -1 else max_length]
     
     if add_ellipsis:
         truncated += "..."
         
     return truncated
 
+@functools.lru_cache(maxsize=1024)
 def add_line_breaks(text: str, max_line_length: int = 40) -> str:
     """Add line breaks to text to improve readability on mobile.
     
+    Full descriptions are wrapped every time a detailed card is shown, so
+    results are cached.
+    
     Args:
         text: Text to format
         max_line_length: Maximum length of each line
@@ -181,14 +224,13 @@ def format_location(neighborhood: str, city: Optional[str] = None) -> str:
     Returns:
         Formatted location string
     """
-    if city and neighborhood:
-        return f"📍 {neighborhood}, {city}"
+    # Cards pass only the neighborhood, so that case is checked first
+    if not city:
+        return f"📍 {neighborhood}" if neighborhood else ""
     elif neighborhood:
-        return f"📍 {neighborhood}"
-    elif city:
-        return f"📍 {city}"
+        return f"📍 {neighborhood}, {city}"
     else:
-        return ""
+        return f"📍 {city}"
 
 # ===== Property Templates =====
 
@@ -203,57 +245,79 @@ def format_property_card(property_data: Dict[str, Any], detailed: bool = False)
         Formatted string for WhatsApp
     """
     try:
-        # Format the price
-        price_formatted = format_price(property_data['price'])
-        
-        # Build the property card header with ID (helps for reference in conversation)
-        property_id = property_data.get('id', 'N/A')
-        card = f"*{property_data['title']}* (Ref: {property_id})\n"
-        
-        # Basic details (always included)
-        card += f"💰 {price_formatted}\n"
-        card += f"🛏️ {property_data['bedrooms']} habitaciones | 🚿 {property_data['bathrooms']} baños\n"
-        
-        # Area and location on same line
-        location = format_location(property_data.get('neighborhood', ''))
-        card += f"📏 {property_data['area']} m² | {location}\n"
-        
-        # Amenities (highlighted differently based on detail level)
-        if 'amenities' in property_data and property_data['amenities']:
-            if detailed:
-                card += f"\n✨ *Características:*\n{format_amenities(property_data['amenities'], max_display=6, style='bullets')}\n"
-            else:
-                card += f"\n✨ *Características:* {format_amenities(property_data['amenities'], style='inline')}\n"
-        
-        # Description (truncated or full based on detail level)
-        if detailed:
-            # Full description with line breaks for readability
-            description = add_line_breaks(property_data['description'])
-            card += f"\n📝 *Descripción:*\n{description}\n"
-        else:
-            # Truncated description
-            description = truncate_text(property_data['description'], max_length=150)
-            card += f"\n{description}\n"
-        
-        # Additional details for detailed view
-        if detailed and 'construction_year' in property_data:
-            card += f"\n🏗️ *Año de construcción:* {property_data['construction_year']}\n"
-        
-        if detailed and 'stratum' in property_data:  # Colombian specific - "estrato"
-            card += f"⭐ *Estrato:* {property_data['stratum']}\n"
-            
-        # Add call to action and link
-        card += f"\n🔗 *Ver detalles completos:* {property_data['url']}\n"
-        
-        # Call to action based on detail level
+        return _render_property_card(
+            detailed=detailed,
+            price=property_data['price'],
+            property_id=property_data.get('id', 'N/A'),
+            title=property_data['title'],
+            bedrooms=property_data['bedrooms'],
+            bathrooms=property_data['bathrooms'],
+            neighborhood=property_data.get('neighborhood', ''),
+            area=property_data['area'],
+            amenities=tuple(property_data.get('amenities') or ()),
+            description=property_data['description'],
+            construction_year=property_data.get('construction_year'),
+            stratum=property_data.get('stratum'),
+            url=property_data['url']
+        )
+    except KeyError as e:
+        return f"Error: Falta información de la propiedad: {str(e)}"
+
+@functools.lru_cache(maxsize=2048)
+def _render_property_card(detailed: bool, price: int, property_id: str, title: str,
+                          bedrooms: int, bathrooms: int, neighborhood: str, area: float,
+                          amenities: tuple, description: str, construction_year: Any,
+                          stratum: Any, url: str) -> str:
+    """Render a property card from its field values.
+    
+    The same properties are shown many times in a conversation, so cards
+    are cached by their content.
+    
+    Returns:
+        Formatted string for WhatsApp
+    """
+    # Build the property card header with ID (helps for reference in conversation)
+    parts = [f"*{title}* (Ref: {property_id})\n"]
+    
+    # Basic details (always included)
+    parts.append(f"💰 {format_price(price)}\n")
+    parts.append(f"🛏️ {bedrooms} habitaciones | 🚿 {bathrooms} baños\n")
+    
+    # Area and location on same line
+    parts.append(f"📏 {area} m² | {format_location(neighborhood)}\n")
+    
+    # Amenities (highlighted differently based on detail level)
+    if amenities:
         if detailed:
-            card += "\n¿Te gustaría agendar una visita a esta propiedad? Puedo coordinar con un asesor para que te contacte."
+            parts.append(f"\n✨ *Características:*\n{format_amenities(amenities, max_display=6, style='bullets')}\n")
         else:
-            card += "\n¿Te gustaría más información sobre esta propiedad?"
+            parts.append(f"\n✨ *Características:* {format_amenities(amenities, style='inline')}\n")
+    
+    # Description (truncated or full based on detail level)
+    if detailed:
+        # Full description with line breaks for readability
+        parts.append(f"\n📝 *Descripción:*\n{add_line_breaks(description)}\n")
+    else:
+        # Truncated description
+        parts.append(f"\n{truncate_text(description, max_length=150)}\n")
+    
+    # Additional details for detailed view
+    if detailed and construction_year is not None:
+        parts.append(f"\n🏗️ *Año de construcción:* {construction_year}\n")
+    
+    if detailed and stratum is not None:  # Colombian specific - "estrato"
+        parts.append(f"⭐ *Estrato:* {stratum}\n")
         
-        return card
-    except KeyError as e:
-        return f"Error: Falta información de la propiedad: {str(e)}"
+    # Add call to action and link
+    parts.append(f"\n🔗 *Ver detalles completos:* {url}\n")
+    
+    # Call to action based on detail level
+    if detailed:
+        parts.append("\n¿Te gustaría agendar una visita a esta propiedad? Puedo coordinar con un asesor para que te contacte.")
+    else:
+        parts.append("\n¿Te gustaría más información sobre esta propiedad?")
+    
+    return "".join(parts)
 
 def format_property_brief(property_data: Dict[str, Any], index: int = None) -> str:
     """Format a single property into a brief summary.
@@ -266,34 +330,48 @@ def format_property_brief(property_data: Dict[str, Any], index: int = None) -> s
         Formatted string for a brief property listing
     """
     try:
-        # Format the price
-        price_formatted = format_price(property_data['price'])
-        
-        # Start with index if provided
-        if index is not None:
-            brief = f"*{index}. {property_data['title']}*\n"
-        else:
-            brief = f"*{property_data['title']}*\n"
-        
-        # Add key details on first line
-        brief += f"💰 {price_formatted} | 🛏️ {property_data['bedrooms']} hab | 📏 {property_data['area']} m²\n"
-        
-        # Add neighborhood and a few words from description on second line
-        neighborhood = property_data.get('neighborhood', 'Ubicación no especificada')
-        description_preview = truncate_text(property_data['description'], max_length=70)
-        brief += f"📍 {neighborhood} | {description_preview}\n"
-        
-        # Add amenities highlights if available (max 3, inline format)
-        if 'amenities' in property_data and property_data['amenities']:
-            brief += f"✨ {format_amenities(property_data['amenities'], max_display=3, style='inline')}\n"
-        
-        # Add link
-        brief += f"🔗 {property_data['url']}\n"
-        
-        return brief
+        return _render_property_brief(
+            index=index,
+            price=property_data['price'],
+            title=property_data['title'],
+            bedrooms=property_data['bedrooms'],
+            area=property_data['area'],
+            neighborhood=property_data.get('neighborhood', 'Ubicación no especificada'),
+            description=property_data['description'],
+            amenities=tuple(property_data.get('amenities') or ()),
+            url=property_data['url']
+        )
     except KeyError as e:
         return f"Error: Falta información de la propiedad: {str(e)}"
 
+@functools.lru_cache(maxsize=2048)
+def _render_property_brief(index: Optional[int], price: int, title: str, bedrooms: int,
+                           area: float, neighborhood: str, description: str,
+                           amenities: tuple, url: str) -> str:
+    """Render a brief property summary from its field values.
+    
+    Briefs are shown in every search result list, so they are cached by
+    their content.
+    
+    Returns:
+        Formatted string for a brief property listing
+    """
+    # Start with index if provided
+    header = f"*{index}. {title}*" if index is not None else f"*{title}*"
+    
+    # Add amenities highlights if available (max 3, inline format)
+    amenities_line = f"✨ {format_amenities(amenities, max_display=3, style='inline')}\n" if amenities else ""
+    
+    # Key details, then neighborhood and a few words from the description,
+    # amenities and link
+    return (
+        f"{header}\n"
+        f"💰 {format_price(price)} | 🛏️ {bedrooms} hab | 📏 {area} m²\n"
+        f"📍 {neighborhood} | {truncate_text(description, max_length=70)}\n"
+        f"{amenities_line}"
+        f"🔗 {url}\n"
+    )
+
 def format_property_comparison(properties: List[Dict[str, Any]], max_properties: int = 3) -> str:
     """Format properties side by side for comparison.
     
@@ -310,59 +388,23 @@ def format_property_comparison(properties: List[Dict[str, Any]], max_properties:
     # Limit number of properties
     properties = properties[:max_properties]
     
-    # Create header
-    comparison = "*COMPARACIÓN DE PROPIEDADES*\n\n"
-    
-    # Headers for each property
-    for i, prop in enumerate(properties, 1):
-        comparison += f"*Propiedad {i}:* {prop['title']}\n"
-    
-    comparison += "\n"
-    
-    # Price comparison
-    comparison += "*💰 Precio:*\n"
-    for prop in properties:
-        comparison += f"- {format_price(prop['price'])}\n"
-    
-    comparison += "\n"
-    
-    # Room comparison
-    comparison += "*🛏️ Habitaciones:*\n"
-    for prop in properties:
-        comparison += f"- {prop['bedrooms']} hab\n"
-    
-    comparison += "\n"
-    
-    # Bathroom comparison
-    comparison += "*🚿 Baños:*\n"
-    for prop in properties:
-        comparison += f"- {prop['bathrooms']} baños\n"
-    
-    comparison += "\n"
-    
-    # Area comparison
-    comparison += "*📏 Área:*\n"
-    for prop in properties:
-        comparison += f"- {prop['area']} m²\n"
-    
-    comparison += "\n"
-    
-    # Location
-    comparison += "*📍 Ubicación:*\n"
-    for prop in properties:
-        comparison += f"- {prop.get('neighborhood', 'No especificada')}\n"
-    
-    comparison += "\n"
-    
-    # Links
-    comparison += "*🔗 Enlaces:*\n"
-    for i, prop in enumerate(properties, 1):
-        comparison += f"- Propiedad {i}: {prop['url']}\n"
-    
-    # Call to action
-    comparison += "\n¿Cuál de estas propiedades te parece más interesante?"
+    # One section per compared field, each with a line per property
+    sections = [
+        "".join(f"*Propiedad {i}:* {prop['title']}\n" for i, prop in enumerate(properties, 1)),
+        "*💰 Precio:*\n" + "".join(f"- {format_price(prop['price'])}\n" for prop in properties),
+        "*🛏️ Habitaciones:*\n" + "".join(f"- {prop['bedrooms']} hab\n" for prop in properties),
+        "*🚿 Baños:*\n" + "".join(f"- {prop['bathrooms']} baños\n" for prop in properties),
+        "*📏 Área:*\n" + "".join(f"- {prop['area']} m²\n" for prop in properties),
+        "*📍 Ubicación:*\n" + "".join(f"- {prop.get('neighborhood', 'No especificada')}\n" for prop in properties),
+        "*🔗 Enlaces:*\n" + "".join(f"- Propiedad {i}: {prop['url']}\n" for i, prop in enumerate(properties, 1))
+    ]
     
-    return comparison
+    # Header, sections separated by blank lines, and call to action
+    return (
+        "*COMPARACIÓN DE PROPIEDADES*\n\n"
+        + "\n".join(sections)
+        + "\n¿Cuál de estas propiedades te parece más interesante?"
+    )
 
 def format_property_list(properties: List[Dict[str, Any]], max_properties: int = 3) -> str:
     """Format a list of properties for WhatsApp display.
@@ -385,23 +427,35 @@ def format_property_list(properties: List[Dict[str, Any]], max_properties: int =
     
     # Start with an intro
     if total_count == 1:
-        message = "✨ *He encontrado esta propiedad que podría interesarte:*\n\n"
+        intro = "✨ *He encontrado esta propiedad que podría interesarte:*\n\n"
     else:
-        message = f"✨ *He encontrado {total_count} propiedades que podrían interesarte:*\n\n"
-    
-    # Add each property
-    for i, prop in enumerate(properties, 1):
-        message += format_property_brief(prop, i)
-        message += "\n"
+        intro = f"✨ *He encontrado {total_count} propiedades que podrían interesarte:*\n\n"
     
     # Add a note if there are more properties
     if total_count > max_properties:
-        message += f"Y {total_count - max_properties} propiedades más que coinciden con tus criterios.\n\n"
+        more = f"Y {total_count - max_properties} propiedades más que coinciden con tus criterios.\n\n"
+    else:
+        more = ""
     
-    # Add a call to action
-    message += "¿Cuál de estas propiedades te gustaría conocer mejor? Puedes pedirme más detalles de la que te interese o decirme si quieres ver otras opciones."
+    # Fill in the layout for this many properties in a single call
+    briefs = [format_property_brief(prop, i) for i, prop in enumerate(properties, 1)]
+    return _property_list_layout(len(briefs)).format(intro, *briefs, more)
+
+@functools.lru_cache(maxsize=None)
+def _property_list_layout(count: int) -> str:
+    """Build the format string of a property list showing count properties.
     
-    return message
+    Args:
+        count: Number of property briefs in the list
+        
+    Returns:
+        Format string taking the intro, each brief and the note about
+        further matches, and ending with the call to action
+    """
+    return (
+        "{}" + "{}\n" * count + "{}"
+        "¿Cuál de estas propiedades te gustaría conocer mejor? Puedes pedirme más detalles de la que te interese o decirme si quieres ver otras opciones."
+    )
 
 def format_property_gallery(properties: List[Dict[str, Any]], max_properties: int = 5) -> str:
     """Format a gallery-style list of properties with minimal details.
@@ -423,28 +477,25 @@ def format_property_gallery(properties: List[Dict[str, Any]], max_properties: in
     properties = properties[:max_properties]
     
     # Start with an intro
-    gallery = f"*GALERÍA DE PROPIEDADES ({total_count} resultados)*\n\n"
+    parts = [f"*GALERÍA DE PROPIEDADES ({total_count} resultados)*\n\n"]
     
     # Format each property with minimal details
-    for i, prop in enumerate(properties, 1):
-        price = format_price(prop['price'])
-        title = prop.get('title', f"Propiedad {i}")
-        area = prop.get('area', 'N/A')
-        bedrooms = prop.get('bedrooms', 'N/A')
-        neighborhood = prop.get('neighborhood', 'Ubicación no especificada')
-        
-        gallery += f"*{i}. {title}*\n"
-        gallery += f"💰 {price} | 🛏️ {bedrooms} hab | 📏 {area} m² | 📍 {neighborhood}\n"
-        gallery += f"🔗 {prop['url']}\n\n"
+    parts.extend(
+        f"*{i}. {prop.get('title', f'Propiedad {i}')}*\n"
+        f"💰 {format_price(prop['price'])} | 🛏️ {prop.get('bedrooms', 'N/A')} hab | "
+        f"📏 {prop.get('area', 'N/A')} m² | 📍 {prop.get('neighborhood', 'Ubicación no especificada')}\n"
+        f"🔗 {prop['url']}\n\n"
+        for i, prop in enumerate(properties, 1)
+    )
     
     # Add a note if there are more properties
     if total_count > max_properties:
-        gallery += f"...y {total_count - max_properties} propiedades más disponibles.\n\n"
+        parts.append(f"...y {total_count - max_properties} propiedades más disponibles.\n\n")
     
     # Add call to action
-    gallery += "Puedes decirme el número de la propiedad para ver más detalles, o indicarme si quieres refinar la búsqueda."
+    parts.append("Puedes decirme el número de la propiedad para ver más detalles, o indicarme si quieres refinar la búsqueda.")
     
-    return gallery
+    return "".join(parts)
 
 # ===== Response Templates =====
 
@@ -457,25 +508,25 @@ def format_no_results_message(filters: Dict[str, Any] = None) -> str:
     Returns:
         Formatted response suggesting alternatives
     """
-    message = "🔍 No encontré propiedades que coincidan exactamente con tus criterios. "
+    parts = ["🔍 No encontré propiedades que coincidan exactamente con tus criterios. "]
     
     if filters:
         if filters.get('max_price'):
-            message += f"El presupuesto máximo de {format_price(filters['max_price'])} podría ser restrictivo. "
+            parts.append(f"El presupuesto máximo de {format_price(filters['max_price'])} podría ser restrictivo. ")
         
         if filters.get('neighborhoods'):
             locations = ', '.join(n.capitalize() for n in filters['neighborhoods'])
-            message += f"No tenemos muchas propiedades disponibles en {locations} actualmente. "
+            parts.append(f"No tenemos muchas propiedades disponibles en {locations} actualmente. ")
         
         if filters.get('min_bedrooms') and filters.get('min_bedrooms') > 2:
-            message += f"Propiedades con {filters['min_bedrooms']} o más habitaciones son menos comunes. "
+            parts.append(f"Propiedades con {filters['min_bedrooms']} o más habitaciones son menos comunes. ")
             
         if filters.get('amenities') and len(filters.get('amenities', [])) > 2:
-            message += "Buscar múltiples características específicas reduce las opciones disponibles. "
+            parts.append("Buscar múltiples características específicas reduce las opciones disponibles. ")
     
-    message += "\n\n¿Te gustaría ajustar alguno de estos criterios? Puedo sugerirte opciones similares si me indicas qué aspectos son más importantes para ti."
+    parts.append("\n\n¿Te gustaría ajustar alguno de estos criterios? Puedo sugerirte opciones similares si me indicas qué aspectos son más importantes para ti.")
     
-    return message
+    return "".join(parts)
 
 def format_filter_summary(filters: Dict[str, Any]) -> str:
     """Format a summary of the filters extracted from user query.
@@ -489,42 +540,42 @@ def format_filter_summary(filters: Dict[str, Any]) -> str:
     if not filters:
         return "Estoy buscando propiedades según tus preferencias generales."
     
-    summary = "🔍 *Estoy buscando propiedades con las siguientes características:*\n\n"
+    parts = ["🔍 *Estoy buscando propiedades con las siguientes características:*\n\n"]
     
     if 'property_type' in filters:
-        summary += f"• *Tipo:* {filters['property_type'].capitalize()}\n"
+        parts.append(f"• *Tipo:* {filters['property_type'].capitalize()}\n")
     
     if 'neighborhoods' in filters:
         neighborhoods = [n.capitalize() for n in filters['neighborhoods']]
-        summary += f"• *Ubicación:* {', '.join(neighborhoods)}\n"
+        parts.append(f"• *Ubicación:* {', '.join(neighborhoods)}\n")
     
     if 'min_price' in filters and 'max_price' in filters:
         min_price = format_price(filters['min_price'])
         max_price = format_price(filters['max_price'])
-        summary += f"• *Precio:* Entre {min_price} y {max_price}\n"
+        parts.append(f"• *Precio:* Entre {min_price} y {max_price}\n")
     elif 'max_price' in filters:
         max_price = format_price(filters['max_price'])
-        summary += f"• *Precio máximo:* {max_price}\n"
+        parts.append(f"• *Precio máximo:* {max_price}\n")
     elif 'min_price' in filters:
         min_price = format_price(filters['min_price'])
-        summary += f"• *Precio mínimo:* {min_price}\n"
+        parts.append(f"• *Precio mínimo:* {min_price}\n")
     
     if 'min_bedrooms' in filters:
-        summary += f"• *Habitaciones:* {filters['min_bedrooms']}+\n"
+        parts.append(f"• *Habitaciones:* {filters['min_bedrooms']}+\n")
     
     if 'min_bathrooms' in filters:
-        summary += f"• *Baños:* {filters['min_bathrooms']}+\n"
+        parts.append(f"• *Baños:* {filters['min_bathrooms']}+\n")
     
     if 'min_area' in filters:
-        summary += f"• *Área mínima:* {filters['min_area']} m²\n"
+        parts.append(f"• *Área mínima:* {filters['min_area']} m²\n")
     
     if 'amenities' in filters:
         amenities = [a.capitalize() for a in filters['amenities']]
-        summary += f"• *Características:* {', '.join(amenities)}\n"
+        parts.append(f"• *Características:* {', '.join(amenities)}\n")
     
-    summary += "\n¿Estos criterios son correctos o te gustaría ajustar alguno?"
+    parts.append("\n¿Estos criterios son correctos o te gustaría ajustar alguno?")
     
-    return summary
+    return "".join(parts)
 
 def format_viewing_request(property_id: str, property_title: str = "", contact_info: Optional[str] = None) -> str:
     """Format a message for scheduling a property viewing.
@@ -539,19 +590,17 @@ def format_viewing_request(property_id: str, property_title: str = "", contact_i
     """
     property_desc = f"{property_title} (Ref: {property_id})" if property_title else f"propiedad (Ref: {property_id})"
     
-    message = f"¡Perfecto! 📅 Para agendar una visita a la {property_desc}, "
-    
     if contact_info:
-        message += f"utilizaré tu información de contacto ({contact_info}). "
+        contact_request = f"utilizaré tu información de contacto ({contact_info}). "
     else:
-        message += "necesitaré algunos datos adicionales. ¿Podrías proporcionarme un número de teléfono donde nuestro asesor pueda contactarte? "
-    
-    message += "\n\nUn asesor de LaHaus se pondrá en contacto contigo en las próximas 24 horas para coordinar la visita. "
-    message += "También puedes contactarnos directamente al *+57 300 123 4567* si prefieres una respuesta más rápida."
-    
-    message += "\n\n¿Hay algún horario específico que te convenga para la visita?"
-    
-    return message
+        contact_request = "necesitaré algunos datos adicionales. ¿Podrías proporcionarme un número de teléfono donde nuestro asesor pueda contactarte? "
+    
+    return (
+        f"¡Perfecto! 📅 Para agendar una visita a la {property_desc}, {contact_request}"
+        "\n\nUn asesor de LaHaus se pondrá en contacto contigo en las próximas 24 horas para coordinar la visita. "
+        "También puedes contactarnos directamente al *+57 300 123 4567* si prefieres una respuesta más rápida."
+        "\n\n¿Hay algún horario específico que te convenga para la visita?"
+    )
 
 def format_contact_agent_request(property_id: str = None, question: str = None) -> str:
     """Format a message for connecting with a human agent.
@@ -563,19 +612,17 @@ def format_contact_agent_request(property_id: str = None, question: str = None)
     Returns:
         Formatted agent connection message
     """
-    message = "👋 Entiendo que deseas hablar con uno de nuestros asesores especializados. "
-    
     if property_id:
-        message += f"Voy a solicitar que un asesor con conocimiento específico sobre la propiedad (Ref: {property_id}) se ponga en contacto contigo. "
+        agent_request = f"Voy a solicitar que un asesor con conocimiento específico sobre la propiedad (Ref: {property_id}) se ponga en contacto contigo. "
     else:
-        message += "Voy a solicitar que uno de nuestros asesores se ponga en contacto contigo lo antes posible. "
+        agent_request = "Voy a solicitar que uno de nuestros asesores se ponga en contacto contigo lo antes posible. "
     
-    if question:
-        message += f"\n\nLe informaré que tienes la siguiente consulta: \"{question}\""
+    question_note = f"\n\nLe informaré que tienes la siguiente consulta: \"{question}\"" if question else ""
     
-    message += "\n\n¿Podrías proporcionarme un número de teléfono donde te puedan contactar? Nuestro equipo se comunicará contigo en las próximas 24 horas laborables."
-    
-    return message
+    return (
+        f"👋 Entiendo que deseas hablar con uno de nuestros asesores especializados. {agent_request}{question_note}"
+        "\n\n¿Podrías proporcionarme un número de teléfono donde te puedan contactar? Nuestro equipo se comunicará contigo en las próximas 24 horas laborables."
+    )
 
 def format_whatsapp_message(message: str) -> str:
     """Format any message for WhatsApp display, handling length limitations.
@@ -590,9 +637,11 @@ def format_whatsapp_message(message: str) -> str:
     MAX_LENGTH = 4096
     
     if len(message) > MAX_LENGTH:
-        # Try to truncate at a paragraph break to keep the message coherent
+        # Try to truncate at a paragraph, line or sentence break to keep the
+        # message coherent (the last paragraph break always ends with the
+        # last line break, so only line breaks and sentence ends are searched)
         truncated = message[:MAX_LENGTH-150]
-        last_break = max(truncated.rfind('\n\n'), truncated.rfind('\n'), truncated.rfind('. '))
+        last_break = max(truncated.rfind('\n'), truncated.rfind('. '))
         
         if last_break > MAX_LENGTH * 0.7:  # Only truncate at break if it's not too short
             truncated = truncated[:last_break]
@@ -605,19 +654,21 @@ def format_whatsapp_message(message: str) -> str:
 def format_welcome_message() -> str:
     """Format a welcome message for new users.
     
+    The message is a single constant string, built at compile time.
+    
     Returns:
         Formatted welcome message
     """
-    message = "👋 *¡Hola! Soy Karol, tu asistente virtual de LaHaus* 🏡\n\n"
-    message += "Estoy aquí para ayudarte a encontrar la propiedad perfecta según tus necesidades. "
-    message += "Para ofrecerte las mejores opciones, me sería de gran ayuda que me cuentes:\n\n"
-    message += "• ¿En qué zona o barrio te gustaría vivir?\n"
-    message += "• ¿Cuál es tu presupuesto aproximado?\n"
-    message += "• ¿Cuántas habitaciones y baños necesitas?\n"
-    message += "• ¿Buscas alguna característica especial como gimnasio, piscina, parqueadero, etc?\n\n"
-    message += "Por ejemplo, puedes decirme: \"*Busco un apartamento en Chapinero con 2 habitaciones y un presupuesto de 450 millones de pesos*\""
-    
-    return message
+    return (
+        "👋 *¡Hola! Soy Karol, tu asistente virtual de LaHaus* 🏡\n\n"
+        "Estoy aquí para ayudarte a encontrar la propiedad perfecta según tus necesidades. "
+        "Para ofrecerte las mejores opciones, me sería de gran ayuda que me cuentes:\n\n"
+        "• ¿En qué zona o barrio te gustaría vivir?\n"
+        "• ¿Cuál es tu presupuesto aproximado?\n"
+        "• ¿Cuántas habitaciones y baños necesitas?\n"
+        "• ¿Buscas alguna característica especial como gimnasio, piscina, parqueadero, etc?\n\n"
+        "Por ejemplo, puedes decirme: \"*Busco un apartamento en Chapinero con 2 habitaciones y un presupuesto de 450 millones de pesos*\""
+    )
 
 def format_search_instructions() -> str:
     """Format instructions on how to search for properties.
@@ -625,17 +676,26 @@ def format_search_instructions() -> str:
     Returns:
         Formatted instructions
     """
-    message = "🔍 *Cómo buscar propiedades con LaHaus*\n\n"
-    message += "Para ayudarte a encontrar la propiedad ideal, puedes indicarme lo siguiente:\n\n"
-    message += "• *Tipo de propiedad:* Apartamento, casa, aparta-estudio, etc.\n"
-    message += "• *Ubicación:* Barrio, zona o ciudad de interés\n"
-    message += "• *Presupuesto:* Rango o presupuesto máximo\n"
-    message += "• *Tamaño:* Número de habitaciones y baños\n"
-    message += "• *Características especiales:* Piscina, gimnasio, parqueadero, etc.\n\n"
-    message += "Ejemplo: \"Busco un apartamento de 2 habitaciones en Chapinero entre 400 y 500 millones, con parqueadero\"\n\n"
-    message += "También puedes refinar tu búsqueda en cualquier momento o pedirme más información sobre una propiedad específica."
-    
-    return message
+    return (
+        "🔍 *Cómo buscar propiedades con LaHaus*\n\n"
+        "Para ayudarte a encontrar la propiedad ideal, puedes indicarme lo siguiente:\n\n"
+        "• *Tipo de propiedad:* Apartamento, casa, aparta-estudio, etc.\n"
+        "• *Ubicación:* Barrio, zona o ciudad de interés\n"
+        "• *Presupuesto:* Rango o presupuesto máximo\n"
+        "• *Tamaño:* Número de habitaciones y baños\n"
+        "• *Características especiales:* Piscina, gimnasio, parqueadero, etc.\n\n"
+        "Ejemplo: \"Busco un apartamento de 2 habitaciones en Chapinero entre 400 y 500 millones, con parqueadero\"\n\n"
+        "También puedes refinar tu búsqueda en cualquier momento o pedirme más información sobre una propiedad específica."
+    )
+
+# Follow-up questions that fit any search
+_GENERIC_QUESTIONS = (
+    "¿Te gustaría ver propiedades en alguna otra zona?",
+    "¿Prefieres ver opciones con un presupuesto diferente?",
+    "¿Hay alguna característica específica que estés buscando?",
+    "¿Prefieres apartamentos o casas?",
+    "¿Te interesa alguna de estas propiedades?"
+)
 
 def format_follow_up_questions(properties: List[Dict[str, Any]] = None) -> List[str]:
     """Generate follow-up questions based on shown properties.
@@ -646,22 +706,13 @@ def format_follow_up_questions(properties: List[Dict[str, Any]] = None) -> List[
     Returns:
         List of follow-up questions
     """
-    generic_questions = [
-        "¿Te gustaría ver propiedades en alguna otra zona?",
-        "¿Prefieres ver opciones con un presupuesto diferente?",
-        "¿Hay alguna característica específica que estés buscando?",
-        "¿Prefieres apartamentos o casas?",
-        "¿Te interesa alguna de estas propiedades?"
-    ]
-    
     if not properties or len(properties) == 0:
-        return generic_questions
+        return list(_GENERIC_QUESTIONS)
     
     specific_questions = []
     
     # Price range adjustment
-    prices = [p['price'] for p in properties]
-    avg_price = sum(prices) / len(prices)
+    avg_price = sum(p['price'] for p in properties) / len(properties)
     specific_questions.append(f"¿Te gustaría ver opciones {'más económicas' if avg_price > 500000000 else 'con más características'} que estas?")
     
     # Location preference
@@ -671,12 +722,13 @@ def format_follow_up_questions(properties: List[Dict[str, Any]] = None) -> List[
         specific_questions.append(f"Además de {locations_str}, ¿hay otras zonas que te interesen?")
     
     # Property type preference
-    property_types = set(p.get('title', '').split()[0].lower() for p in properties)
+    property_types = {p.get('title', '').split(maxsplit=1)[0].lower() for p in properties}
     if 'apartamento' in property_types and 'casa' not in property_types:
         specific_questions.append("¿Te interesaría ver también opciones de casas?")
     elif 'casa' in property_types and 'apartamento' not in property_types:
         specific_questions.append("¿Te interesaría ver también opciones de apartamentos?")
     
     # Add generic questions to fill out the list
-    combined = specific_questions + [q for q in generic_questions if q not in specific_questions]
+    asked = set(specific_questions)
+    combined = specific_questions + [q for q in _GENERIC_QUESTIONS if q not in asked]
     return combined[:5]  # Return up to 5 questions
\ No newline at end of file
@@ -1,8 +1,53 @@
-import json
+import atexit
 import os
-from datetime import datetime
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import orjson
 from loguru import logger
 
+def setup_logging(log_dir='logs', level='INFO', rotation='10 MB', retention=5):
+    """Configure loguru to log to stderr and to a size-capped file
+    
+    File writes go through a background queue so a slow disk doesn't
+    stall request handling, and old files are rotated out.
+    
+    Args:
+        log_dir: Directory for the application log file
+        level: Minimum level to log; records below it are never formatted
+        rotation: Size at which the log file is rotated
+        retention: Number of rotated files to keep
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+    logger.add(
+        os.path.join(log_dir, 'app.log'),
+        level=level,
+        rotation=rotation,
+        retention=retention,
+        enqueue=True
+    )
+
+# Directories already created by this process
+_ENSURED_DIRS = set()
+
+def ensure_dir(path):
+    """Create a directory (and its parents) once per process
+    
+    Later calls for the same path return without touching the filesystem.
+    
+    Args:
+        path: Directory to create; empty for the current directory
+    """
+    if path and path not in _ENSURED_DIRS:
+        os.makedirs(path, exist_ok=True)
+        _ENSURED_DIRS.add(path)
+
 def load_json_data(filepath):
     """Load data from a JSON file
     
@@ -14,34 +59,40 @@ def load_json_data(filepath):
     """
     try:
         if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(filepath, 'rb') as f:
+                return orjson.loads(f.read())
         else:
             logger.warning(f"File not found: {filepath}")
             return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.error(f"Invalid JSON in file: {filepath}")
         return None
     except Exception as e:
         logger.error(f"Error loading JSON file {filepath}: {str(e)}")
         return None
 
-def save_json_data(data, filepath):
+def save_json_data(data, filepath, pretty=False):
     """Save data to a JSON file
     
     Args:
         data: The data to save
         filepath: Path where to save the JSON file
+        pretty: Indent the JSON for files meant to be read by people
         
     Returns:
         Boolean indicating success or failure
     """
     try:
         # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        ensure_dir(os.path.dirname(filepath))
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Serialized before opening, so a failure leaves any existing file intact
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        content = orjson.dumps(data, option=option)
+        with open(filepath, 'wb') as f:
+            f.write(content)
         return True
     except Exception as e:
         logger.error(f"Error saving JSON file {filepath}: {str(e)}")
@@ -60,9 +111,129 @@ def format_whatsapp_message(message):
     # like handling newlines, formatting text, etc.
     return message
 
+# Descriptors of the conversation log files kept open between writes, by
+# path (only used by the log writer thread, and by close_log_files once it
+# is idle)
+_LOG_FILES = {}
+
+# Conversation log entries waiting to be written, as (path, UTF-8 bytes) pairs
+_LOG_QUEUE = queue.Queue()
+_LOG_BATCH_SIZE = 256
+
+# Size at which a conversation log file is set aside and a new one started
+_LOG_FILE_MAX_SIZE = 64 << 20
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _get_log_file(path):
+    """Get an append descriptor for a conversation log file
+    
+    Descriptors stay open for the rest of the process. Opening the file for
+    a new day closes the previous day's file in the same directory.
+    
+    Args:
+        path: Path of the log file
+        
+    Returns:
+        File descriptor opened with O_APPEND
+    """
+    fd = _LOG_FILES.get(path)
+    if fd is None:
+        # Close the files of earlier days
+        directory = os.path.dirname(path)
+        for old_path in [p for p in _LOG_FILES if os.path.dirname(p) == directory]:
+            os.close(_LOG_FILES.pop(old_path))
+        
+        fd = _LOG_FILES[path] = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    return fd
+
+def _rotate_log_file(path):
+    """Close a full conversation log file and move it aside
+    
+    The file is renamed with a timestamp before its extension (it sorts
+    before the file of the same day that replaces it), and the next entry
+    for the path starts a new file. If another process already moved it,
+    the descriptor is just closed.
+    
+    Args:
+        path: Path of the log file
+    """
+    fd = _LOG_FILES.pop(path)
+    try:
+        if os.stat(path).st_ino == os.fstat(fd).st_ino:
+            stem, ext = os.path.splitext(path)
+            os.replace(path, f"{stem}.{time.time_ns()}{ext}")
+    finally:
+        os.close(fd)
+
+def _write_log_entries():
+    """Write queued conversation log entries in batches, forever
+    
+    Each batch takes every entry already waiting (up to _LOG_BATCH_SIZE)
+    and appends the entries for each file with a single write, so the logs
+    can be read while the app runs and workers sharing a file never split
+    each other's entries.
+    """
+    while True:
+        batch = [_LOG_QUEUE.get()]
+        while len(batch) < _LOG_BATCH_SIZE:
+            try:
+                batch.append(_LOG_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        
+        entries_by_path = {}
+        for path, data in batch:
+            entries_by_path.setdefault(path, []).append(data)
+        
+        for path, entries in entries_by_path.items():
+            try:
+                fd = _get_log_file(path)
+                data = memoryview(b"".join(entries))
+                while data:
+                    data = data[os.write(fd, data):]
+                if os.fstat(fd).st_size >= _LOG_FILE_MAX_SIZE:
+                    _rotate_log_file(path)
+            except Exception as e:
+                logger.error(f"Error writing conversation log {path}: {str(e)}")
+        
+        for _ in batch:
+            _LOG_QUEUE.task_done()
+
+def _queue_log_entry(path, data):
+    """Queue an entry to be appended to a conversation log file
+    
+    Args:
+        path: Path of the log file
+        data: UTF-8 encoded entry
+    """
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = threading.Thread(target=_write_log_entries, name="conversation-log-writer", daemon=True)
+                _log_writer.start()
+    _LOG_QUEUE.put((path, data))
+
+def flush_log_files():
+    """Wait until every queued conversation log entry has been written"""
+    if _log_writer is not None:
+        _LOG_QUEUE.join()
+
+@atexit.register
+def close_log_files():
+    """Write pending conversation log entries and close the log files"""
+    flush_log_files()
+    for fd in _LOG_FILES.values():
+        os.close(fd)
+    _LOG_FILES.clear()
+
 def log_conversation(user_id, user_message, ai_response, processing_time=None, log_dir='logs'):
     """Log conversation exchange to a file and structured JSON.
     
+    Entries are written by a background thread, so this doesn't wait on
+    the disk.
+    
     Args:
         user_id: Identifier for the user
         user_message: Message from the user
@@ -72,7 +243,7 @@ def log_conversation(user_id, user_message, ai_response, processing_time=None, l
     """
     try:
         # Ensure log directory exists
-        os.makedirs(log_dir, exist_ok=True)
+        ensure_dir(log_dir)
         
         # Generate timestamp
         timestamp = datetime.now()
@@ -80,22 +251,20 @@ def log_conversation(user_id, user_message, ai_response, processing_time=None, l
         date_str = timestamp.strftime('%Y-%m-%d')
         
         # 1. Log to human-readable text file
-        log_file = os.path.join(log_dir, f"conversation_{date_str}.log")
-        log_entry = f"[{timestamp_str}] User: {user_id}\n"
-        log_entry += f"User: {user_message}\n"
-        log_entry += f"AI: {ai_response}\n"
+        entry_parts = [
+            f"[{timestamp_str}] User: {user_id}\n",
+            f"User: {user_message}\n",
+            f"AI: {ai_response}\n"
+        ]
         if processing_time:
-            log_entry += f"Processing time: {processing_time:.2f}s\n"
-        log_entry += "-" * 50 + "\n"
+            entry_parts.append(f"Processing time: {processing_time:.2f}s\n")
+        entry_parts.append("-" * 50 + "\n")
         
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
+        _queue_log_entry(os.path.join(log_dir, f"conversation_{date_str}.log"), "".join(entry_parts).encode())
         
         # 2. Log to structured JSON for analytics
         json_log_dir = os.path.join(log_dir, 'json')
-        os.makedirs(json_log_dir, exist_ok=True)
-        
-        json_log_file = os.path.join(json_log_dir, f"conversation_{date_str}.jsonl")
+        ensure_dir(json_log_dir)
         
         # Create structured log entry
         structured_entry = {
@@ -111,111 +280,188 @@ def log_conversation(user_id, user_message, ai_response, processing_time=None, l
         }
         
         # Append to JSON Lines file
-        with open(json_log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(structured_entry, ensure_ascii=False) + '\n')
+        _queue_log_entry(
+            os.path.join(json_log_dir, f"conversation_{date_str}.jsonl"),
+            orjson.dumps(structured_entry, option=orjson.OPT_APPEND_NEWLINE)
+        )
             
     except Exception as e:
         logger.error(f"Error logging conversation: {str(e)}")
 
-def analyze_logs(log_dir='logs', days=1):
+def _read_jsonl(filepath, chunk_size=1 << 20):
+    """Parse a JSON Lines file, skipping invalid lines
+    
+    The file is read in large binary chunks that are split into lines
+    here, and orjson parses each line straight from bytes.
+    
+    Args:
+        filepath: Path to the JSON Lines file
+        chunk_size: Number of bytes read at a time
+        
+    Yields:
+        Parsed entry of each valid line
+    """
+    with open(filepath, 'rb') as f:
+        carry = b''
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            lines = (carry + chunk).split(b'\n')
+            # The last piece may be a partial line, completed by the next chunk
+            carry = lines.pop()
+            for line in lines:
+                # Blank lines are skipped without raising a parse error
+                if line.strip():
+                    try:
+                        yield orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+        if carry.strip():
+            try:
+                yield orjson.loads(carry)
+            except orjson.JSONDecodeError:
+                pass
+
+def _summarize_log_file(filepath):
+    """Add up the entries of one JSON Lines conversation log
+    
+    Args:
+        filepath: Path to the log file
+        
+    Returns:
+        Tuple of (Counter with the file's message, processing time and
+        message length totals, dictionary of a Counter per user with their
+        message count and processing time total)
+    """
+    totals = Counter()
+    users = {}
+    
+    for entry in _read_jsonl(filepath):
+        user_id = entry.get("user_id")
+        
+        # Track per-user stats
+        stats = users.get(user_id)
+        if stats is None:
+            stats = users[user_id] = Counter()
+        
+        stats["message_count"] += 1
+        
+        # Track processing time
+        processing_time = entry.get("processing_time")
+        if processing_time:
+            totals["processing_time"] += processing_time
+            stats["time_sum"] += processing_time
+            stats["time_count"] += 1
+        
+        # Track message lengths
+        message_length = entry.get("message_length")
+        if message_length:
+            if "user" in message_length:
+                totals["user_length_sum"] += message_length["user"]
+                totals["user_length_count"] += 1
+            if "ai" in message_length:
+                totals["ai_length_sum"] += message_length["ai"]
+                totals["ai_length_count"] += 1
+        
+        totals["messages"] += 1
+    
+    return totals, users
+
+def analyze_logs(log_dir='logs', days=1, max_users=50000):
     """Analyze conversation logs for insights.
     
     Args:
         log_dir: Directory containing logs
         days: Number of days to analyze
+        max_users: Most users to report individually; past it only user ids
+            are kept and the results leave out the per-user list
         
     Returns:
         Dictionary with analysis results
     """
     try:
+        # Include entries still waiting to be written
+        flush_log_files()
+        
         json_log_dir = os.path.join(log_dir, 'json')
         if not os.path.exists(json_log_dir):
             return {"error": "No log data available"}
         
-        # Get log files from the last N days
-        now = datetime.now()
-        log_files = []
-        
-        for i in range(days):
-            date_str = (now - datetime.timedelta(days=i)).strftime('%Y-%m-%d')
-            log_file = os.path.join(json_log_dir, f"conversation_{date_str}.jsonl")
-            if os.path.exists(log_file):
-                log_files.append(log_file)
+        # Get log files from the last N days (rotated ones included), with
+        # one read of the directory
+        today = datetime.now().date()
+        wanted = {(today - timedelta(days=i)).isoformat() for i in range(days)}
+        with os.scandir(json_log_dir) as entries:
+            log_files = sorted(
+                entry.path for entry in entries
+                if entry.name.startswith("conversation_") and entry.name.endswith(".jsonl")
+                and entry.name[13:23] in wanted and entry.is_file()
+            )
         
         if not log_files:
             return {"error": f"No log data available for the last {days} days"}
         
-        # Analyze logs
+        # Summarize each day's file in parallel (reading and splitting the
+        # files overlaps), then combine the totals in date order
+        totals = Counter()
         conversations = {}
-        total_messages = 0
-        total_processing_time = 0
-        user_message_lengths = []
-        ai_message_lengths = []
-        
-        for log_file in log_files:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line)
-                        user_id = entry.get("user_id")
-                        
-                        # Track per-user stats
-                        if user_id not in conversations:
-                            conversations[user_id] = {
-                                "message_count": 0,
-                                "avg_response_time": 0
-                            }
-                        
-                        conversations[user_id]["message_count"] += 1
-                        
-                        # Track processing time
-                        if entry.get("processing_time"):
-                            total_processing_time += entry["processing_time"]
-                            
-                            # Update average response time for this user
-                            prev_count = conversations[user_id]["message_count"] - 1
-                            prev_avg = conversations[user_id]["avg_response_time"]
-                            new_avg = (prev_avg * prev_count + entry["processing_time"]) / conversations[user_id]["message_count"]
-                            conversations[user_id]["avg_response_time"] = new_avg
-                        
-                        # Track message lengths
-                        if "message_length" in entry:
-                            if "user" in entry["message_length"]:
-                                user_message_lengths.append(entry["message_length"]["user"])
-                            if "ai" in entry["message_length"]:
-                                ai_message_lengths.append(entry["message_length"]["ai"])
-                        
-                        total_messages += 1
-                        
-                    except json.JSONDecodeError:
-                        continue
+        user_ids = None
+        with ThreadPoolExecutor(max_workers=min(8, len(log_files))) as executor:
+            for file_totals, file_users in executor.map(_summarize_log_file, log_files):
+                totals.update(file_totals)
+                if user_ids is not None:
+                    user_ids.update(file_users)
+                    continue
+                for user_id, stats in file_users.items():
+                    conversations.setdefault(user_id, Counter()).update(stats)
+                
+                # Too many users to report: keep counting them, but drop their stats
+                if len(conversations) > max_users:
+                    user_ids = set(conversations)
+                    conversations = {}
         
         # Calculate averages
-        avg_user_message_length = sum(user_message_lengths) / len(user_message_lengths) if user_message_lengths else 0
-        avg_ai_message_length = sum(ai_message_lengths) / len(ai_message_lengths) if ai_message_lengths else 0
-        avg_processing_time = total_processing_time / total_messages if total_messages > 0 else 0
+        total_messages = totals["messages"]
+        avg_user_message_length = totals["user_length_sum"] / totals["user_length_count"] if totals["user_length_count"] else 0
+        avg_ai_message_length = totals["ai_length_sum"] / totals["ai_length_count"] if totals["ai_length_count"] else 0
+        avg_processing_time = totals["processing_time"] / total_messages if total_messages > 0 else 0
         
         # Return analysis results
-        return {
-            "total_users": len(conversations),
+        analysis = {
+            "total_users": len(conversations) if user_ids is None else len(user_ids),
             "total_messages": total_messages,
             "avg_processing_time": avg_processing_time,
             "avg_user_message_length": avg_user_message_length,
-            "avg_ai_message_length": avg_ai_message_length,
-            "users": [
+            "avg_ai_message_length": avg_ai_message_length
+        }
+        if user_ids is None:
+            analysis["users"] = [
                 {
                     "user_id": user_id,
                     "message_count": stats["message_count"],
-                    "avg_response_time": stats["avg_response_time"]
+                    "avg_response_time": stats["time_sum"] / stats["time_count"] if stats["time_count"] else 0
                 }
                 for user_id, stats in conversations.items()
             ]
-        }
+        return analysis
         
     except Exception as e:
         logger.error(f"Error analyzing logs: {str(e)}")
         return {"error": f"Error analyzing logs: {str(e)}"}
 
+# This pattern is a simplified version and may not catch all emojis
+_EMOJI_RE = re.compile("["
+                       u"\U0001F600-\U0001F64F"  # emoticons
+                       u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+                       u"\U0001F680-\U0001F6FF"  # transport & map symbols
+                       u"\U0001F700-\U0001F77F"  # alchemical symbols
+                       u"\U0001F780-\U0001F7FF"  # Geometric Shapes
+                       u"\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
+                       u"\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
+                       u"\U0001FA00-\U0001FA6F"  # Chess Symbols
+                       u"\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
+                       u"\U00002702-\U000027B0"  # Dingbats
+                       u"\U000024C2-\U0001F251" 
+                       "]+", flags=re.UNICODE)
+
 def extract_emoji_from_text(text):
     """Extract emojis from text.
     
@@ -225,20 +471,4 @@ def extract_emoji_from_text(text):
     Returns:
         List of emojis found in the text
     """
-    import re
-    # This pattern is a simplified version and may not catch all emojis
-    emoji_pattern = re.compile("["
-                               u"\U0001F600-\U0001F64F"  # emoticons
-                               u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                               u"\U0001F680-\U0001F6FF"  # transport & map symbols
-                               u"\U0001F700-\U0001F77F"  # alchemical symbols
-                               u"\U0001F780-\U0001F7FF"  # Geometric Shapes
-                               u"\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
-                               u"\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-                               u"\U0001FA00-\U0001FA6F"  # Chess Symbols
-                               u"\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
-                               u"\U00002702-\U000027B0"  # Dingbats
-                               u"\U000024C2-\U0001F251" 
-                               "]+", flags=re.UNICODE)
-    
-    return emoji_pattern.findall(text)
+    return _EMOJI_RE.findall(text)
@@ -0,0 +1,25 @@
+"""Hypercorn settings for production deployments
+
+Run with: hypercorn -c file:hypercorn_config.py app.app:app
+
+With more than one worker Hypercorn binds the listening socket with
+SO_REUSEPORT, so the kernel spreads new connections across workers. Set
+REDIS_URL so the workers share conversation state.
+"""
+import importlib.util
+import os
+
+from app.config import PORT
+
+bind = [f"0.0.0.0:{PORT}"]
+
+# One worker per core by default; the app is I/O bound, so each worker
+# already serves many webhooks concurrently on its event loop
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+# uvloop is not available on Windows
+worker_class = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+# Room for bursts of incoming webhooks while workers are busy
+backlog = 2048
+keep_alive_timeout = 75
@@ -1,14 +1,16 @@
-from app.app import app
-from app.config import init_config, PORT
-import os
+from app.config import init_config, DEBUG_MODE, PORT, LOG_DIR, LOG_LEVEL, LOG_ROTATION
+from app.utils import setup_logging
 
 if __name__ == "__main__":
-    # Initialize configuration
+    # Initialize configuration before the application is imported
     init_config()
+    setup_logging(LOG_DIR, LOG_LEVEL, LOG_ROTATION)
     
-    # Run the Flask application
+    from app.app import app
+    
+    # Run the Quart application (use hypercorn for production)
     app.run(
         host="0.0.0.0",
         port=PORT,
-        debug=os.getenv("DEBUG_MODE", "False").lower() == "true"
-    )
\ No newline at end of file
+        debug=DEBUG_MODE
+    )
@@ -7,7 +7,18 @@ from unittest.mock import patch, MagicMock
 # Add parent directory to path so we can import the app package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.agent import create_agent_prompt, extract_client_preferences
+from app.agent import (
+    create_agent_prompt,
+    extract_client_preferences,
+    _PREFERENCE_HINT_RE,
+    _is_greeting,
+    PropertySearchCallbackHandler,
+    ReplyStreamCallbackHandler,
+    _start_agent_run,
+    _finish_agent_run,
+    _exact_cache,
+    run_agent_async
+)
 from app.memory import PropertyConciergeMemory
 
 class TestAgentConfiguration(unittest.TestCase):
@@ -40,11 +51,269 @@ class TestAgentConfiguration(unittest.TestCase):
         self.assertIn("amenities", preferences)
         self.assertIn("parqueadero", preferences["amenities"])
         
+    def test_preference_extraction_budget(self):
+        """Test budget, room and property type extraction in one conversation"""
+        test_conversation = [
+            {"role": "user", "content": "Busco casa entre 300 y 500 millones"},
+            {"role": "assistant", "content": "¿Cuántas habitaciones necesitas?"},
+            {"role": "user", "content": "3 habitaciones y 2 baños"},
+        ]
+        
+        preferences = extract_client_preferences(test_conversation)
+        
+        self.assertEqual(preferences["budget_min"], 300000000)
+        self.assertEqual(preferences["budget_max"], 500000000)
+        self.assertEqual(preferences["bedrooms"], 3)
+        self.assertEqual(preferences["bathrooms"], 2)
+        self.assertEqual(preferences["property_type"], "casa")
+        
+        # A minimum alone is not also taken as the maximum budget
+        preferences = extract_client_preferences([{"role": "user", "content": "desde 300 millones"}])
+        self.assertEqual(preferences, {"budget_min": 300000000})
+        
+    def test_preference_extraction_matches_whole_words(self):
+        """Test that keywords match whole words (and simple plurals) only"""
+        test_conversation = [
+            {"role": "user", "content": "Busco algo de buena calidad con gimnasios y terrazas"},
+        ]
+        
+        preferences = extract_client_preferences(test_conversation)
+        
+        # "cali" must not be picked up from "calidad"
+        self.assertNotIn("locations", preferences)
+        self.assertEqual(preferences["amenities"], ["gimnasio", "terraza"])
+        
+        # Plurals ending in "es"
+        test_conversation = [
+            {"role": "user", "content": "Que tenga balcones, jardines y ascensores"},
+        ]
+        
+        preferences = extract_client_preferences(test_conversation)
+        self.assertEqual(preferences["amenities"], ["balcon", "jardin", "ascensor"])
+        
+    def test_preference_hint_prefilter(self):
+        """Test that only messages that may hold preferences are scanned"""
+        for message in ["gracias", "ok", "cuéntame más"]:
+            self.assertIsNone(_PREFERENCE_HINT_RE.search(message))
+        for message in ["Algo en Chapinero", "con piscina", "una casa", "2 habitaciones"]:
+            self.assertIsNotNone(_PREFERENCE_HINT_RE.search(message))
+        
+    def test_greeting_detection(self):
+        """Test the greeting fast path used for first messages"""
+        self.assertTrue(_is_greeting("¡Hola! Busco un apartamento en Chapinero"))
+        self.assertTrue(_is_greeting("Buenos días, quisiera información"))
+        self.assertTrue(_is_greeting("apto chapinero"))
+        self.assertFalse(_is_greeting("Busco un apartamento en Chapinero"))
+        self.assertFalse(_is_greeting("\n" * 25 + "busco apto en chapinero"))
+        self.assertTrue(_is_greeting(" " * 25 + "hola, busco apto"))
+        
+    def test_search_callback_handler(self):
+        """Test that property searches are collected from tool callbacks"""
+        from app.search import create_property_search_tool
+        
+        handler = PropertySearchCallbackHandler()
+        search_tool = create_property_search_tool()
+        search_tool.invoke({"query": "apartamento en chapinero"}, config={"callbacks": [handler]})
+        
+        self.assertEqual(len(handler.searches), 1)
+        query, output = handler.searches[0]
+        self.assertIn("chapinero", str(query))
+        self.assertIn("https://lahaus.com/properties/", output)
+        
+    def test_reply_stream_callback_handler(self):
+        """Test that streamed replies are sent at paragraph and sentence breaks"""
+        import asyncio
+        
+        sent = []
+        async def send(chunk):
+            sent.append(chunk)
+        
+        handler = ReplyStreamCallbackHandler(send, chunk_size=30)
+        reply = "Tengo dos opciones.\n\nLa primera está en Chapinero. La segunda en Usaquén y tiene piscina"
+        
+        async def stream():
+            for token in reply.split(" "):
+                await handler.on_llm_new_token(token + " ")
+            await handler.on_llm_end(None)
+        
+        asyncio.run(stream())
+        
+        self.assertEqual(sent, [
+            "Tengo dos opciones.",
+            "La primera está en Chapinero.",
+            "La segunda en Usaquén y tiene piscina"
+        ])
+        self.assertTrue(handler.sent)
+        
+    @patch("app.agent.get_response_cache", return_value=None)
+    def test_exact_cache_for_short_first_messages(self, mock_cache):
+        """Test that short opening messages reuse the reply to the same text"""
+        from langchain_community.llms import FakeListLLM
+        
+        def new_agent():
+            llm = FakeListLLM(responses=["Resumen"], custom_get_token_ids=lambda text: text.split())
+            return MagicMock(memory=PropertyConciergeMemory(llm=llm))
+        
+        self.addCleanup(_exact_cache.clear)
+        agent = new_agent()
+        early_response, cache, exact_key = _start_agent_run(agent, "Busco apto en Chapinero")
+        self.assertIsNone(early_response)
+        self.assertEqual(exact_key, "busco apto en chapinero")
+        
+        _finish_agent_run(agent, "Busco apto en Chapinero", {"output": "Respuesta"}, cache, exact_key, PropertySearchCallbackHandler())
+        
+        # Same text from another user is answered from the cache
+        other_agent = new_agent()
+        early_response, _, _ = _start_agent_run(other_agent, "busco  apto en chapinero ")
+        self.assertEqual(early_response, "Respuesta")
+        self.assertEqual(len(other_agent.memory.chat_memory.messages), 2)
+        
+        # Later in a conversation the cache isn't used
+        self.assertIsNone(_start_agent_run(other_agent, "Busco apto en Chapinero")[0])
+        
+    @patch("app.agent.get_response_cache", return_value=None)
+    def test_reply_caches_are_cleared_when_catalog_changes(self, mock_cache):
+        """Test that cached replies don't outlive the catalog they quote"""
+        from app.cache import SemanticResponseCache
+        
+        self.addCleanup(_exact_cache.clear)
+        semantic_cache = SemanticResponseCache(lambda text: [1.0, 0.0], threshold=0.5)
+        agent = MagicMock()
+        agent.memory = None
+        
+        with patch("app.agent._response_cache", semantic_cache), \
+                patch("app.agent.get_catalog_version", return_value=(1, 100)):
+            _start_agent_run(agent, "precios")
+            _exact_cache["precios"] = "Respuesta"
+            semantic_cache.add("busco apartamento", "Respuesta")
+            self.assertEqual(_start_agent_run(agent, "precios")[0], "Respuesta")
+        
+        with patch("app.agent._response_cache", semantic_cache), \
+                patch("app.agent.get_catalog_version", return_value=(2, 100)):
+            self.assertIsNone(_start_agent_run(agent, "precios")[0])
+        self.assertEqual(len(_exact_cache), 0)
+        self.assertEqual(len(semantic_cache), 0)
+        
+    @patch("app.agent.get_response_cache", return_value=None)
+    def test_reply_is_sent_before_bookkeeping(self, mock_cache):
+        """Test that memory bookkeeping runs after the reply is delivered"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        
+        events = []
+        async def send(chunk):
+            events.append(("sent", chunk))
+        
+        agent = MagicMock()
+        agent.memory.chat_memory.messages = ["hola", "hola"]
+        agent.ainvoke = AsyncMock(return_value={"output": "Respuesta"})
+        
+        with patch("app.agent._finish_agent_run", side_effect=lambda *args: events.append(("finished",))):
+            response = asyncio.run(run_agent_async(agent, "Busco apartamento en Chapinero", on_chunk=send))
+        
+        self.assertEqual(response, "Respuesta")
+        self.assertEqual(events, [("sent", "Respuesta"), ("finished",)])
+        
     def test_property_concierge_memory(self):
         """Test the custom memory implementation (simplified)"""
-        # Skip this test for now due to compatibility issues with Pydantic
-        # We'll test this functionality through integration tests
-        pass
+        from langchain_community.llms import FakeListLLM
+        
+        llm = FakeListLLM(responses=["Resumen"], custom_get_token_ids=lambda text: text.split())
+        memory = PropertyConciergeMemory(llm=llm)
+        
+        # Check preferences and property history tracking
+        memory.update_user_preferences({"bedrooms": 2})
+        memory.add_property_to_history({"id": "prop1"})
+        memory.add_property_to_history({"id": "prop1"})
+        self.assertEqual(memory.user_preferences, {"bedrooms": 2})
+        self.assertEqual(len(memory.property_history), 1)
+
+        # Check that list preferences are merged across updates
+        memory.update_user_preferences({"locations": ["chapinero"], "bedrooms": 3})
+        memory.update_user_preferences({"locations": ["chapinero", "usaquen"]})
+        self.assertEqual(memory.user_preferences, {"bedrooms": 3, "locations": ["chapinero", "usaquen"]})
+        
+        # Check engagement counters
+        memory.log_search("apartamento en chapinero")
+        self.assertEqual(memory.engagement_metrics["search_count"], 1)
+        
+        # Check that clearing resets the specialized storage
+        memory.clear()
+        self.assertEqual(memory.user_preferences, {})
+        self.assertEqual(memory.property_history, [])
+        self.assertEqual(memory.engagement_metrics["search_count"], 0)
+        
+        # A cleared property can be added again
+        memory.add_property_to_history({"id": "prop1"})
+        self.assertEqual(len(memory.property_history), 1)
+        
+    def test_property_concierge_memory_summary(self):
+        """Test that older messages are folded into a bounded summary"""
+        from langchain_community.llms import FakeListLLM
+        
+        llm = FakeListLLM(responses=["resumen " * 20], custom_get_token_ids=lambda text: text.split())
+        memory = PropertyConciergeMemory(llm=llm, max_token_limit=20)
+        
+        memory.save_context({"input": "busco apartamento " * 5}, {"output": "claro " * 5})
+        memory.save_context({"input": "en chapinero " * 5}, {"output": "perfecto " * 5})
+        
+        # Older messages were summarized and the summary kept within budget
+        self.assertTrue(memory.moving_summary_buffer)
+        self.assertLessEqual(llm.get_num_tokens(memory.moving_summary_buffer), 10)
+        self.assertEqual(memory.engagement_metrics["message_count"], 2)
+
+    def test_property_concierge_memory_buffer_string(self):
+        """Test that the buffer renders like langchain's get_buffer_string"""
+        from langchain_community.llms import FakeListLLM
+        from langchain.schema.messages import AIMessage, ChatMessage, HumanMessage, SystemMessage, get_buffer_string
+
+        memory = PropertyConciergeMemory(llm=FakeListLLM(responses=["Resumen"]))
+        messages = [
+            HumanMessage(content="hola"),
+            AIMessage(content="¿qué buscas?"),
+            SystemMessage(content="resumen"),
+            AIMessage(content="", additional_kwargs={"function_call": {"name": "search"}}),
+            ChatMessage(role="agente", content="listo")
+        ]
+        self.assertEqual(memory._buffer_as_string(messages), get_buffer_string(messages))
+
+    def test_property_concierge_memory_dynamic_context(self):
+        """Test that summary and preferences stay out of the message buffer"""
+        from langchain_community.llms import FakeListLLM
+        from app.agent import _PROMPT, _SYSTEM_PROMPT
+
+        llm = FakeListLLM(responses=["Resumen"], custom_get_token_ids=lambda text: text.split())
+        memory = PropertyConciergeMemory(llm=llm)
+        memory.save_context({"input": "hola"}, {"output": "hola, ¿qué buscas?"})
+        memory.moving_summary_buffer = "El cliente busca apartamento"
+        memory.update_user_preferences({"bedrooms": 2})
+
+        variables = memory.load_memory_variables({})
+        self.assertEqual(len(variables["chat_history"]), 2)
+        self.assertEqual(len(variables["dynamic_context"]), 2)
+
+        # The system message is unchanged and comes first
+        messages = _PROMPT.format_messages(input="gracias", agent_scratchpad=[], **variables)
+        self.assertEqual(messages[0].content, _SYSTEM_PROMPT)
+        self.assertIn("bedrooms", messages[-2].content)
+
+    def test_property_concierge_memory_async_summary(self):
+        """Test that the async save path also summarizes older messages"""
+        import asyncio
+        from langchain_community.llms import FakeListLLM
+
+        llm = FakeListLLM(responses=["resumen " * 20], custom_get_token_ids=lambda text: text.split())
+        memory = PropertyConciergeMemory(llm=llm, max_token_limit=20)
+
+        async def save_turns():
+            await memory.asave_context({"input": "busco apartamento " * 5}, {"output": "claro " * 5})
+            await memory.asave_context({"input": "en chapinero " * 5}, {"output": "perfecto " * 5})
+
+        asyncio.run(save_turns())
+
+        self.assertTrue(memory.moving_summary_buffer)
+        self.assertLessEqual(llm.get_num_tokens_from_messages(memory.chat_memory.messages), 20)
+        self.assertEqual(memory.engagement_metrics["message_count"], 2)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import unittest
+import asyncio
+import importlib
+import os
+import sys
+from unittest.mock import patch, AsyncMock, MagicMock, call
+
+# Add parent directory to path so we can import the app package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.callbacks import AsyncCallbackManager
+from langchain_core.outputs import LLMResult
+
+from app.app import PROCESSING_ERROR_MESSAGE, process_message
+
+# The module itself (the package exports the Quart app under the same name)
+app_module = importlib.import_module("app.app")
+
+def streaming_agent(tokens):
+    """Build a fake agent that streams tokens through the run's callbacks"""
+    async def ainvoke(inputs, config):
+        manager = AsyncCallbackManager(handlers=config["callbacks"])
+        run_manager = (await manager.on_llm_start({}, ["prompt"]))[0]
+        for token in tokens:
+            await run_manager.on_llm_new_token(token)
+        await run_manager.on_llm_end(LLMResult(generations=[]))
+        return {"output": "".join(tokens)}
+
+    agent = MagicMock()
+    agent.memory.chat_memory.messages = ["hola", "hola"]
+    agent.ainvoke = ainvoke
+    return agent
+
+class TestProcessMessage(unittest.TestCase):
+    @patch("app.agent.get_response_cache", return_value=None)
+    def test_failed_reply_chunk_sends_error_message(self, mock_cache):
+        """Test that a streamed piece that can't be sent fails the whole turn"""
+        sender, bot_number = "whatsapp:+570000000000", "whatsapp:+570000000001"
+        agent = streaming_agent(["Primera parte.\n\n", "Segunda parte.\n\n", "Tercera parte."])
+        send = AsyncMock(side_effect=[None, RuntimeError("Twilio unavailable"), None])
+
+        with patch.object(app_module, "agent_instances", {sender: agent}), \
+                patch.object(app_module, "send_whatsapp_message", send), \
+                patch.object(app_module, "log_conversation") as mock_log:
+            asyncio.run(process_message(sender, bot_number, "Busco apartamento en Chapinero"))
+
+        self.assertEqual(send.await_args_list, [
+            call(sender, bot_number, "Primera parte."),
+            call(sender, bot_number, "Segunda parte."),
+            call(sender, bot_number, PROCESSING_ERROR_MESSAGE)
+        ])
+        mock_log.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
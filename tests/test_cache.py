@@ -0,0 +1,114 @@
+import unittest
+import os
+import sys
+from cachetools import LRUCache
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+# Add parent directory to path so we can import the app package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import SemanticResponseCache
+from app.agent import PropertySearchCallbackHandler, _start_agent_run, _finish_agent_run
+
+def fake_embedding(text):
+    """Embed text as a bag of a few known words (enough for similarity tests)."""
+    vocabulary = ["apartamento", "apto", "chapinero", "usaquen", "busco", "tienes", "casa"]
+    words = text.split()
+    vector = [float(sum(word.startswith(term) for word in words)) for term in vocabulary]
+    # Treat "apto" as a synonym of "apartamento"
+    vector[0] += vector[1]
+    vector[1] = 0.0
+    return vector
+
+class TestSemanticResponseCache(unittest.TestCase):
+    def test_near_duplicate_query_hits(self):
+        cache = SemanticResponseCache(fake_embedding, threshold=0.8)
+        cache.add("busco apartamento en Chapinero", "Respuesta Chapinero")
+
+        self.assertEqual(cache.lookup("Busco   apto en chapinero"), "Respuesta Chapinero")
+        self.assertIsNone(cache.lookup("tienes casa en usaquen"))
+
+    def test_different_filters_miss(self):
+        cache = SemanticResponseCache(fake_embedding, threshold=0.8)
+        cache.add("busco apartamento en chapinero con 2 habitaciones", "Respuesta 2 hab")
+
+        # Same wording but a different bedroom count must not share an answer
+        self.assertIsNone(cache.lookup("busco apartamento en chapinero con 3 habitaciones"))
+
+    def test_oldest_entry_is_evicted(self):
+        cache = SemanticResponseCache(fake_embedding, threshold=0.8, max_entries=2)
+        cache.add("busco apartamento", "Respuesta 1")
+        cache.add("tienes casa", "Respuesta 2")
+        cache.add("chapinero", "Respuesta 3")
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup("busco apartamento"))
+        self.assertEqual(cache.lookup("chapinero"), "Respuesta 3")
+
+    def test_clear(self):
+        cache = SemanticResponseCache(fake_embedding, threshold=0.8)
+        cache.add("busco apartamento", "Respuesta 1")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.lookup("busco apartamento"))
+
+        cache.add("tienes casa", "Respuesta 2")
+        self.assertEqual(cache.lookup("tienes casa"), "Respuesta 2")
+
+    def test_embedding_errors_are_misses(self):
+        def failing_embedding(text):
+            raise RuntimeError("API unavailable")
+
+        cache = SemanticResponseCache(failing_embedding)
+        cache.add("busco apartamento", "Respuesta")
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.lookup("busco apartamento"))
+
+    def test_concurrent_adds_keep_entries_paired(self):
+        count = 200
+
+        def one_hot_embedding(text):
+            vector = [0.0] * count
+            vector[int(text.split()[-1])] = 1.0
+            return vector
+
+        cache = SemanticResponseCache(one_hot_embedding, threshold=0.99, max_entries=count)
+
+        # Switch threads as often as possible so unguarded updates interleave
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: cache.add(f"consulta {i}", f"Respuesta {i}"), range(count)))
+
+        self.assertEqual(len(cache), count)
+        for i in range(count):
+            self.assertEqual(cache.lookup(f"consulta {i}"), f"Respuesta {i}")
+
+class TestExactResponseCache(unittest.TestCase):
+    @patch("app.agent.get_response_cache", return_value=None)
+    def test_concurrent_runs_share_the_cache_safely(self, mock_cache):
+        exact_cache = LRUCache(maxsize=16)
+        agent = MagicMock(memory=None)
+        search_handler = PropertySearchCallbackHandler()
+
+        def run(i):
+            # Store a new reply (evicting the oldest) and look up a recent one
+            message = f"precios {i}"
+            _finish_agent_run(agent, message, {"output": f"Respuesta {i}"}, None, message, search_handler)
+            _start_agent_run(agent, f"precios {i - 3}")
+
+        # Switch threads as often as possible so unguarded updates interleave
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        with patch("app.agent._exact_cache", exact_cache), \
+                patch("app.agent.get_catalog_version", lambda: (1, 100)):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(run, range(20000)))
+
+        self.assertEqual(len(exact_cache), 16)
+        for key, response in exact_cache.items():
+            self.assertEqual(response, f"Respuesta {key.split()[-1]}")
+
+if __name__ == '__main__':
+    unittest.main()
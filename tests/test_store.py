@@ -0,0 +1,161 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path so we can import the app package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.store import ConversationMessage, InMemoryConversationStore, RedisConversationStore, create_conversation_store
+
+try:
+    from fakeredis import FakeAsyncRedis
+except ImportError:
+    FakeAsyncRedis = None
+
+class TestInMemoryConversationStore(unittest.TestCase):
+    def test_history_is_trimmed(self):
+        store = InMemoryConversationStore(max_messages=3)
+
+        async def scenario():
+            for i in range(5):
+                await store.append_message("user", ConversationMessage("user", str(i), float(i), str(i)))
+            return await store.get_history("user")
+
+        history = asyncio.run(scenario())
+        self.assertEqual([m.content for m in history], ["2", "3", "4"])
+
+    def test_clear_and_preferences(self):
+        store = InMemoryConversationStore()
+
+        async def scenario():
+            await store.append_message("user", ConversationMessage("user", "hola", 0.0, "1"))
+            await store.save_preferences("user", {"location": "chapinero"})
+            self.assertEqual(await store.get_preferences("user"), {"location": "chapinero"})
+            self.assertEqual(await store.count_conversations(), 1)
+            self.assertEqual(await store.conversation_lengths(["user", "other"]), [1, 0])
+
+            await store.clear("user")
+            self.assertEqual(await store.get_history("user"), [])
+            self.assertEqual(await store.get_preferences("user"), {})
+            self.assertFalse(await store.has_conversation("user"))
+
+        asyncio.run(scenario())
+
+    def test_record_turn(self):
+        store = InMemoryConversationStore(max_messages=3)
+
+        async def scenario():
+            await store.append_message("user", ConversationMessage("user", "0", 0.0, "0"))
+            await store.record_turn(
+                "user",
+                ConversationMessage("user", "1", 1.0, "1"),
+                ConversationMessage("assistant", "2", 2.0, "2", 0.5),
+                {"bedrooms": 2}
+            )
+            await store.record_turn(
+                "user",
+                ConversationMessage("user", "3", 3.0, "3"),
+                ConversationMessage("assistant", "4", 4.0, "4", 0.5),
+                {"bedrooms": 3}
+            )
+            history = await store.get_history("user")
+            self.assertEqual([m.content for m in history], ["2", "3", "4"])
+            self.assertEqual(await store.get_preferences("user"), {"bedrooms": 3})
+
+        asyncio.run(scenario())
+
+    def test_metrics(self):
+        store = InMemoryConversationStore()
+
+        async def scenario():
+            await store.record_incoming_message("user", 100.0)
+            await store.record_incoming_message("user", 160.0)
+            await store.record_incoming_message("other", 120.0)
+            metrics = await store.get_metrics()
+            self.assertEqual(metrics["user"], {"total_messages": 2, "session_start": 100.0, "last_activity": 160.0})
+            self.assertEqual(await store.total_messages(), 3)
+            self.assertEqual(await store.count_users(), 2)
+            self.assertEqual(list(await store.get_metrics(offset=1, limit=1)), ["other"])
+
+        asyncio.run(scenario())
+
+    def test_least_recent_conversation_is_evicted(self):
+        store = InMemoryConversationStore(max_conversations=2)
+
+        async def scenario():
+            for sender in ("a", "b", "a", "c"):
+                await store.append_message(sender, ConversationMessage("user", "hola", 0.0, "1"))
+            self.assertEqual(await store.count_conversations(), 2)
+            self.assertFalse(await store.has_conversation("b"))
+            self.assertEqual(len(await store.get_history("a")), 2)
+
+        asyncio.run(scenario())
+
+    def test_default_store_is_in_memory(self):
+        self.assertIsInstance(create_conversation_store(""), InMemoryConversationStore)
+
+@unittest.skipIf(FakeAsyncRedis is None, "fakeredis is not installed")
+class TestRedisConversationStore(unittest.TestCase):
+    def run_with_store(self, scenario, **kwargs):
+        async def run():
+            redis = FakeAsyncRedis(decode_responses=True)
+            try:
+                await scenario(RedisConversationStore(redis, **kwargs))
+            finally:
+                await redis.aclose()
+
+        asyncio.run(run())
+
+    def test_history_is_trimmed(self):
+        async def scenario(store):
+            for i in range(5):
+                await store.append_message("user", ConversationMessage("user", str(i), float(i), str(i)))
+            history = await store.get_history("user")
+            self.assertEqual([m.content for m in history], ["2", "3", "4"])
+
+        self.run_with_store(scenario, max_messages=3)
+
+    def test_clear_and_preferences(self):
+        async def scenario(store):
+            await store.append_message("user", ConversationMessage("user", "hola", 0.0, "1"))
+            await store.save_preferences("user", {"location": "chapinero"})
+            self.assertTrue(await store.has_conversation("user"))
+            self.assertEqual(await store.get_preferences("user"), {"location": "chapinero"})
+            self.assertEqual(await store.count_conversations(), 1)
+            self.assertEqual(await store.conversation_lengths(["user", "other"]), [1, 0])
+
+            await store.clear("user")
+            self.assertEqual(await store.get_history("user"), [])
+            self.assertEqual(await store.get_preferences("user"), {})
+            self.assertFalse(await store.has_conversation("user"))
+            self.assertEqual(await store.count_conversations(), 0)
+
+        self.run_with_store(scenario)
+
+    def test_expired_conversation(self):
+        async def scenario(store):
+            await store.record_incoming_message("user", time.time() - 120)
+            self.assertFalse(await store.has_conversation("user"))
+            self.assertEqual(await store.count_conversations(), 0)
+
+        self.run_with_store(scenario, ttl=60)
+
+    def test_metrics(self):
+        async def scenario(store):
+            now = time.time()
+            await store.record_incoming_message("user", now - 20)
+            await store.record_incoming_message("user", now)
+            await store.record_incoming_message("other", now - 10)
+            metrics = await store.get_metrics()
+            self.assertEqual(metrics["user"], {"total_messages": 2, "session_start": now - 20, "last_activity": now})
+            self.assertEqual(list(metrics), ["user", "other"])
+            self.assertEqual(await store.total_messages(), 3)
+            self.assertEqual(await store.count_users(), 2)
+            self.assertEqual(list(await store.get_metrics(offset=1, limit=1)), ["other"])
+
+        self.run_with_store(scenario)
+
+if __name__ == '__main__':
+    unittest.main()
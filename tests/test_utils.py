@@ -0,0 +1,54 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path so we can import the app package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import analyze_logs, close_log_files, flush_log_files, log_conversation
+
+class TestConversationLogs(unittest.TestCase):
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log_dir = log_dir.name
+        self.addCleanup(close_log_files)
+
+    def test_analyze_logs(self):
+        log_conversation("user", "hola", "buenas", 1.0, log_dir=self.log_dir)
+        log_conversation("user", "casa", "claro", 3.0, log_dir=self.log_dir)
+        log_conversation("other", "hi", "hey", None, log_dir=self.log_dir)
+
+        analysis = analyze_logs(self.log_dir, days=2)
+        self.assertEqual(analysis["total_users"], 2)
+        self.assertEqual(analysis["total_messages"], 3)
+        self.assertAlmostEqual(analysis["avg_user_message_length"], 10 / 3)
+        self.assertEqual(analysis["users"][0], {"user_id": "user", "message_count": 2, "avg_response_time": 2.0})
+
+    def test_full_log_files_are_rotated(self):
+        with patch("app.utils._LOG_FILE_MAX_SIZE", 1):
+            log_conversation("user", "hola", "buenas", 1.0, log_dir=self.log_dir)
+            flush_log_files()
+            log_conversation("user", "casa", "claro", 3.0, log_dir=self.log_dir)
+            analysis = analyze_logs(self.log_dir)
+
+        self.assertEqual(len(os.listdir(os.path.join(self.log_dir, "json"))), 2)
+        self.assertEqual(analysis["total_messages"], 2)
+        self.assertEqual(analysis["users"][0]["avg_response_time"], 2.0)
+
+    def test_analyze_logs_user_cap(self):
+        for user_id in ("a", "b", "c"):
+            log_conversation(user_id, "hola", "buenas", 1.0, log_dir=self.log_dir)
+
+        analysis = analyze_logs(self.log_dir, max_users=2)
+        self.assertEqual(analysis["total_users"], 3)
+        self.assertEqual(analysis["total_messages"], 3)
+        self.assertNotIn("users", analysis)
+
+    def test_analyze_logs_without_data(self):
+        self.assertEqual(analyze_logs(self.log_dir), {"error": "No log data available"})
+
+if __name__ == '__main__':
+    unittest.main()